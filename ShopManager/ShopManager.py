@@ -7,13 +7,61 @@ from typing import List, Optional, Callable, Dict
 from PIL import Image, ImageTk
 import psycopg2
 from psycopg2 import Error as PgError
+from psycopg2.errors import InvalidSqlStatementName
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+from psycopg2.extras import execute_values
 import queue
+import select
+import sqlite3
 import winreg
 import time
+import json
+import threading
+import atexit
+import functools
+import random
+import sys
+import io
+import gzip
+import tempfile
+import argparse
+import cProfile
+import pstats
+import tracemalloc
+import weakref
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 COR_ICON_ITEM = "#DDC6F2"
 COR_ICON_ITEMMALL = "#F8D7C0"
 
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+ITEMMALL_COLUMNS = (
+    "item_id",
+    "item_group",
+    "item_index",
+    "item_num",
+    "money_unit",
+    "point",
+    "special_price",
+    "sell",
+    "on_sell_date",
+    "not_sell_date",
+    "account_num_limit",
+    "recognized_percentage",
+    "fortune_bag",
+    "allow_buy_level",
+    "new_account_day_limit",
+    "note",
+)
+ITEMMALL_COLUMN_LIST = ", ".join(ITEMMALL_COLUMNS)
+
 
 @dataclass
 class ItemMall:
@@ -36,6 +84,13 @@ class ItemMall:
     icon_name: str = ""
     display_name: str = ""
 
+    @property
+    def key(self) -> tuple:
+        return (self.item_id, self.item_group, self.item_index, self.money_unit)
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, column) for column in ITEMMALL_COLUMNS)
+
 
 class Tooltip:
     def __init__(self, widget, text):
@@ -67,6 +122,861 @@ class Tooltip:
             self.tooltip = None
 
 
+class AppSettings:
+    def __init__(self, env_path: Optional[str] = None):
+        self.env_path = env_path or os.path.join(APP_DIR, ".env")
+        self.values: Dict[str, str] = {}
+        self.reload()
+
+    def reload(self):
+        self.values = {}
+        if not os.path.exists(self.env_path):
+            return
+        try:
+            with open(self.env_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if "=" in line:
+                        key, value = line.strip().split("=", 1)
+                        self.values[key] = value
+        except Exception as e:
+            print(f"Erro ao ler configurações do arquivo .env: {e}")
+
+    def update(self, new_values: Dict[str, str]):
+        self.reload()
+        self.values.update({key: str(value) for key, value in new_values.items()})
+        with open(self.env_path, "w", encoding="utf-8") as f:
+            for key, value in self.values.items():
+                f.write(f"{key}={value}\n")
+
+    def get(self, key: str, default: str = "") -> str:
+        return self.values.get(key, default)
+
+    def get_int(self, key: str, default: int) -> int:
+        try:
+            return int(self.values.get(key, default))
+        except ValueError:
+            return default
+
+    def get_float(self, key: str, default: float) -> float:
+        try:
+            return float(self.values.get(key, default))
+        except ValueError:
+            return default
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.values.get(key)
+        if value is None:
+            return default
+        return value.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+def format_log_message(message: str, args: tuple) -> str:
+    if not args:
+        return message
+    try:
+        return message % args
+    except (TypeError, ValueError):
+        return f"{message} {args!r}"
+
+
+class StructuredLogger:
+    """Grava registros JSON-lines em disco numa thread própria, com rotação por tamanho."""
+
+    def __init__(
+        self,
+        log_dir: str,
+        file_name: str = "shopmanager.log",
+        level: str = "INFO",
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 5,
+        max_pending: int = 10000,
+    ):
+        self.log_dir = log_dir
+        self.file_path = os.path.join(log_dir, file_name)
+        self.level = LOG_LEVELS["INFO"]
+        self.set_level(level)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.record_queue = queue.Queue(maxsize=max_pending)
+        self.dropped_records = 0
+        self.writer_thread = None
+        self.start_lock = threading.Lock()
+
+    def set_level(self, level: str):
+        self.level = LOG_LEVELS.get(str(level).upper(), LOG_LEVELS["INFO"])
+
+    def is_enabled(self, level: str) -> bool:
+        return LOG_LEVELS.get(level, LOG_LEVELS["INFO"]) >= self.level
+
+    def log(self, message: str, *args, level="INFO", source="DEFAULT", **fields):
+        if not self.is_enabled(level):
+            return
+        self._ensure_writer()
+        try:
+            self.record_queue.put_nowait(
+                (time.time(), level, source, message, args, fields)
+            )
+        except queue.Full:
+            self.dropped_records += 1
+
+    def _ensure_writer(self):
+        if self.writer_thread:
+            return
+        with self.start_lock:
+            if self.writer_thread:
+                return
+            self.writer_thread = threading.Thread(
+                target=self._writer_loop, name="log-writer", daemon=True
+            )
+            self.writer_thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout: float = 2.0):
+        if not self.writer_thread:
+            return
+        try:
+            self.record_queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.writer_thread.join(timeout)
+        self.writer_thread = None
+
+    def _serialize(self, record) -> str:
+        timestamp, level, source, message, args, fields = record
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+            + f".{int((timestamp % 1) * 1000):03d}",
+            "level": level,
+            "source": source,
+            "message": format_log_message(message, args),
+        }
+        entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            older = f"{self.file_path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.file_path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.file_path, f"{self.file_path}.1")
+        else:
+            os.remove(self.file_path)
+
+    def _writer_loop(self):
+        stream = None
+        running = True
+        while running:
+            batch = [self.record_queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.record_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [record for record in batch if record is not None]
+            if not batch:
+                continue
+            try:
+                if stream is None:
+                    os.makedirs(self.log_dir, exist_ok=True)
+                    stream = open(self.file_path, "a", encoding="utf-8")
+                for record in batch:
+                    line = self._serialize(record)
+                    if stream.tell() > 0 and stream.tell() + len(line) > self.max_bytes:
+                        stream.close()
+                        self._rotate()
+                        stream = open(self.file_path, "a", encoding="utf-8")
+                    stream.write(line)
+                stream.flush()
+            except Exception as e:
+                print(f"Erro ao gravar log em disco: {e}")
+                if stream:
+                    stream.close()
+                    stream = None
+        if stream:
+            stream.close()
+
+
+APP_SETTINGS = AppSettings()
+
+FILE_LOGGER = StructuredLogger(
+    APP_SETTINGS.get("LOG_DIR") or os.path.join(APP_DIR, "logs"),
+    level=APP_SETTINGS.get("LOG_LEVEL", "INFO"),
+    max_bytes=APP_SETTINGS.get_int("LOG_MAX_BYTES", 5 * 1024 * 1024),
+    backup_count=APP_SETTINGS.get_int("LOG_BACKUP_COUNT", 5),
+)
+
+
+class LatencyHistogram:
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, reservoir_size: int = 2048):
+        self.count = 0
+        self.total = 0.0
+        self.max_value = 0.0
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.samples = deque(maxlen=reservoir_size)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max_value = max(self.max_value, seconds)
+        self.samples.append(seconds)
+        for index, bound in enumerate(self.BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[index] += 1
+                return
+        self.bucket_counts[-1] += 1
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+        return ordered[rank]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max_value,
+        }
+
+
+def metric_key(name: str, labels: Optional[Dict[str, object]] = None) -> tuple:
+    if not labels:
+        return (name, ())
+    return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+
+def metric_display_name(key: tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{label}={value}" for label, value in labels) + "}"
+
+
+class Tracer:
+    """Spans aninhados por thread, exportáveis no formato Chrome Trace (chrome://tracing / Perfetto)."""
+
+    def __init__(self, max_spans: int = 50000, enabled: bool = True):
+        self.enabled = enabled
+        self.spans = deque(maxlen=max_spans)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.origin = time.perf_counter()
+
+    def _new_id(self) -> int:
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def current_span_id(self) -> Optional[int]:
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else None
+
+    def context(self) -> Optional[tuple]:
+        """(span atual, thread, instante), para continuar o trace em outra thread com span(cause=...)."""
+        span_id = self.current_span_id() if self.enabled else None
+        if span_id is None:
+            return None
+        return span_id, threading.get_ident(), time.perf_counter() - self.origin
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        args: Optional[Dict] = None,
+        parent_id: Optional[int] = None,
+        cause: Optional[tuple] = None,
+    ):
+        if not self.enabled:
+            yield None
+            return
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        span_id = self._new_id()
+        if cause is not None:
+            parent_id = cause[0]
+        if parent_id is None and stack:
+            parent_id = stack[-1]
+        stack.append(span_id)
+        start = time.perf_counter()
+        try:
+            yield span_id
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            self.spans.append(
+                (
+                    span_id,
+                    parent_id,
+                    name,
+                    start - self.origin,
+                    end - start,
+                    threading.get_ident(),
+                    threading.current_thread().name,
+                    args,
+                    cause,
+                )
+            )
+
+    def traced(self, name: Optional[str] = None):
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def clear(self):
+        self.spans.clear()
+
+    def export_chrome_trace(self, file_path: str) -> int:
+        spans = list(self.spans)
+        pid = os.getpid()
+        events = []
+        thread_names = {}
+        for span_id, parent_id, name, start, duration, thread_id, thread_name, args, cause in spans:
+            thread_names[thread_id] = thread_name
+            event_args = {"span_id": span_id}
+            if parent_id is not None:
+                event_args["parent_id"] = parent_id
+            if args:
+                event_args.update({key: str(value) for key, value in args.items()})
+            events.append(
+                {
+                    "name": name,
+                    "cat": name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": round(start * 1_000_000, 3),
+                    "dur": round(duration * 1_000_000, 3),
+                    "pid": pid,
+                    "tid": thread_id,
+                    "args": event_args,
+                }
+            )
+            if cause is not None:
+                # Seta de fluxo do span que enviou o trabalho até o que o executou.
+                flow = {"name": "causa", "cat": "flow", "id": span_id, "pid": pid}
+                events.append(
+                    dict(flow, ph="s", ts=round(cause[2] * 1_000_000, 3), tid=cause[1])
+                )
+                events.append(
+                    dict(flow, ph="f", bp="e", ts=round(start * 1_000_000, 3), tid=thread_id)
+                )
+        for thread_id, thread_name in thread_names.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": thread_id,
+                    "args": {"name": thread_name},
+                }
+            )
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(spans)
+
+
+TRACER = Tracer(
+    max_spans=APP_SETTINGS.get_int("TRACE_MAX_SPANS", 50000),
+    enabled=APP_SETTINGS.get_bool("TRACE_ENABLED", True),
+)
+
+
+class MetricsRegistry:
+    """Histogramas de latência (relógio monotônico), contadores e medidores por operação."""
+
+    def __init__(self, tracer: Optional[Tracer] = None):
+        self.tracer = tracer
+        self.lock = threading.Lock()
+        self.histograms: Dict[tuple, LatencyHistogram] = {}
+        self.counters: Dict[tuple, float] = {}
+        self.gauges: Dict[tuple, float] = {}
+        self.listeners: List[Callable[[str, float], None]] = []
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict] = None):
+        key = metric_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(name, seconds)
+
+    def add_listener(self, listener: Callable[[str, float], None]):
+        with self.lock:
+            if listener not in self.listeners:
+                self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, float], None]):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
+    def increment(self, name: str, value: float = 1, labels: Optional[Dict] = None):
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict] = None):
+        with self.lock:
+            self.gauges[metric_key(name, labels)] = value
+
+    def replace_gauges(self, name: str, series: List[tuple]):
+        with self.lock:
+            for key in [key for key in self.gauges if key[0] == name]:
+                del self.gauges[key]
+            for labels, value in series:
+                self.gauges[metric_key(name, labels)] = value
+
+    @contextmanager
+    def timer(self, name: str, labels: Optional[Dict] = None):
+        with self.tracer.span(name, labels) if self.tracer else nullcontext():
+            start = time.perf_counter()
+            try:
+                yield
+            except Exception:
+                self.increment(f"{name}.errors", labels=labels)
+                raise
+            finally:
+                self.observe(name, time.perf_counter() - start, labels)
+
+    def timed(self, name: Optional[str] = None):
+        def decorator(func):
+            metric_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(metric_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.lock:
+            return {
+                "histograms": {
+                    metric_display_name(key): histogram.summary()
+                    for key, histogram in self.histograms.items()
+                },
+                "counters": {
+                    metric_display_name(key): value
+                    for key, value in self.counters.items()
+                },
+                "gauges": {
+                    metric_display_name(key): value
+                    for key, value in self.gauges.items()
+                },
+            }
+
+    def render_openmetrics(self, prefix: str = "shopmanager") -> str:
+        def family_name(name: str, suffix: str = "") -> str:
+            return re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}{suffix}")
+
+        def label_text(labels: tuple, extra: tuple = ()) -> str:
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (
+                (label, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                for label, value in pairs
+            )
+            return "{" + ",".join(f'{label}="{value}"' for label, value in escaped) + "}"
+
+        def grouped(series: Dict[tuple, object]) -> Dict[str, List[tuple]]:
+            families: Dict[str, List[tuple]] = {}
+            for (name, labels), value in sorted(series.items()):
+                families.setdefault(name, []).append((labels, value))
+            return families
+
+        lines = []
+        with self.lock:
+            for name, series in grouped(self.histograms).items():
+                family = family_name(name, "_seconds")
+                lines.append(f"# TYPE {family} histogram")
+                lines.append(f"# UNIT {family} seconds")
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip(
+                        LatencyHistogram.BUCKETS, histogram.bucket_counts
+                    ):
+                        cumulative += count
+                        lines.append(
+                            f"{family}_bucket{label_text(labels, (('le', repr(bound)),))} {cumulative}"
+                        )
+                    lines.append(
+                        f'{family}_bucket{label_text(labels, (("le", "+Inf"),))} {histogram.count}'
+                    )
+                    lines.append(f"{family}_count{label_text(labels)} {histogram.count}")
+                    lines.append(f"{family}_sum{label_text(labels)} {histogram.total}")
+            for name, series in grouped(self.counters).items():
+                family = family_name(name)
+                lines.append(f"# TYPE {family} counter")
+                for labels, value in series:
+                    lines.append(f"{family}_total{label_text(labels)} {value}")
+            for name, series in grouped(self.gauges).items():
+                family = family_name(name)
+                lines.append(f"# TYPE {family} gauge")
+                for labels, value in series:
+                    lines.append(f"{family}{label_text(labels)} {value}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry(tracer=TRACER)
+
+
+class MetricsHttpServer:
+    """Servidor HTTP local (somente localhost) com as métricas em formato OpenMetrics."""
+
+    CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1"):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+        content_type = self.CONTENT_TYPE
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render_openmetrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics-http", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            self.thread = None
+
+
+class SessionProfiler:
+    """Liga cProfile/tracemalloc numa janela da sessão e grava relatórios anotados com as ações executadas."""
+
+    def __init__(self, output_dir: str, registry: MetricsRegistry):
+        self.output_dir = output_dir
+        self.registry = registry
+        self.cpu_profiler = None
+        self.memory_enabled = False
+        self.memory_baseline = None
+        self.started_at = 0.0
+        self.started_perf = 0.0
+        self.actions = []
+        self.lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self.cpu_profiler is not None or self.memory_enabled
+
+    def start(self, cpu: bool = True, memory: bool = True) -> bool:
+        if self.is_running or not (cpu or memory):
+            return False
+        with self.lock:
+            self.actions = []
+        self.started_at = time.time()
+        self.started_perf = time.perf_counter()
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self.memory_enabled = True
+            self.memory_baseline = tracemalloc.take_snapshot()
+        if cpu:
+            self.cpu_profiler = cProfile.Profile()
+            self.cpu_profiler.enable()
+        self.registry.add_listener(self.record_action)
+        return True
+
+    def record_action(self, name: str, seconds: float):
+        offset = time.perf_counter() - self.started_perf - seconds
+        with self.lock:
+            self.actions.append((offset, name, seconds))
+
+    def stop(self) -> List[str]:
+        if not self.is_running and self.memory_baseline is None:
+            return []
+        self.registry.remove_listener(self.record_action)
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(
+            self.output_dir,
+            "sessao_" + time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started_at)),
+        )
+        with self.lock:
+            actions = list(self.actions)
+        written = []
+
+        if self.cpu_profiler is not None:
+            self.cpu_profiler.disable()
+        memory_snapshot = None
+        if self.memory_baseline is not None:
+            memory_snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+
+        if self.cpu_profiler is not None:
+            self.cpu_profiler.dump_stats(prefix + ".prof")
+            written.append(prefix + ".prof")
+            report = io.StringIO()
+            self._write_actions(report, actions)
+            report.write("\n=== Funções por tempo acumulado ===\n")
+            stats = pstats.Stats(self.cpu_profiler, stream=report)
+            stats.sort_stats("cumulative").print_stats(40)
+            with open(prefix + "_cpu.txt", "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
+            written.append(prefix + "_cpu.txt")
+            self.cpu_profiler = None
+
+        if memory_snapshot is not None:
+            report = io.StringIO()
+            self._write_actions(report, actions)
+            report.write(
+                f"\nMemória rastreada: atual {current / 1024:.1f} KiB, pico {peak / 1024:.1f} KiB\n"
+            )
+            report.write("\n=== Maiores crescimentos desde o início ===\n")
+            for stat in memory_snapshot.compare_to(self.memory_baseline, "lineno")[
+                :25
+            ]:
+                report.write(f"{stat}\n")
+            report.write("\n=== Maiores alocações atuais ===\n")
+            for stat in memory_snapshot.statistics("lineno")[:25]:
+                report.write(f"{stat}\n")
+            with open(prefix + "_memoria.txt", "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
+            written.append(prefix + "_memoria.txt")
+            self.memory_baseline = None
+            if self.memory_enabled:
+                tracemalloc.stop()
+                self.memory_enabled = False
+        return written
+
+    def _write_actions(self, report, actions):
+        duration = time.time() - self.started_at
+        report.write(
+            f"Sessão iniciada em {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))}"
+            f" ({duration:.1f} s)\n"
+        )
+        report.write("\n=== Ações executadas ===\n")
+        totals: Dict[str, List[float]] = {}
+        for _, name, seconds in actions:
+            totals.setdefault(name, []).append(seconds)
+        for name, durations in sorted(
+            totals.items(), key=lambda entry: sum(entry[1]), reverse=True
+        ):
+            report.write(
+                f"{name}: {len(durations)}x, total {sum(durations) * 1000:.1f} ms, "
+                f"máx {max(durations) * 1000:.1f} ms\n"
+            )
+        report.write("\n=== Linha do tempo ===\n")
+        for offset, name, seconds in actions:
+            report.write(f"+{offset:9.3f} s  {name} ({seconds * 1000:.1f} ms)\n")
+
+
+PROFILER = SessionProfiler(
+    APP_SETTINGS.get("PROFILE_DIR") or os.path.join(APP_DIR, "profiles"), METRICS
+)
+
+
+class ItemSnapshotStore:
+    """Guarda as linhas de itemmall do último carregamento num arquivo gzip por servidor."""
+
+    VERSION = 2
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path_for(self, server: str) -> str:
+        name = re.sub(r"[^\w.-]", "_", server)
+        return os.path.join(self.directory, f"itemmall_{name}.json.gz")
+
+    def load(self, server: str) -> Optional[tuple]:
+        """Retorna (linhas, salvo_em, impressão_digital) ou None se não houver snapshot utilizável."""
+        path = self.path_for(server)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != self.VERSION or tuple(data.get("columns", ())) != ITEMMALL_COLUMNS:
+                return None
+            fingerprint = {
+                (group, money_unit): (count, digest)
+                for group, money_unit, count, digest in data.get("fingerprint") or ()
+            }
+            return [tuple(row) for row in data["rows"]], data["saved_at"], fingerprint or None
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, zlib.error, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Arquivo truncado ou corrompido: descarta para não falhar de novo a cada abertura.
+            FILE_LOGGER.log(
+                "Snapshot local ilegível em %s, descartado: %s", path, e, level="WARNING", source="DB"
+            )
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def save(self, server: str, rows: List[tuple], fingerprint: Optional[Dict] = None):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(server)
+        # Arquivo temporário exclusivo: duas gravações simultâneas não se misturam.
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.directory, prefix=os.path.basename(path) + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "version": self.VERSION,
+                        "saved_at": time.time(),
+                        "columns": list(ITEMMALL_COLUMNS),
+                        "rows": rows,
+                        "fingerprint": [
+                            [group, money_unit, count, digest]
+                            for (group, money_unit), (count, digest) in (fingerprint or {}).items()
+                        ],
+                    },
+                    f,
+                    separators=(",", ":"),
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+SNAPSHOTS = ItemSnapshotStore(
+    APP_SETTINGS.get("SNAPSHOT_DIR") or os.path.join(APP_DIR, "snapshots")
+)
+
+
+def estimate_mapping_size(mapping: Dict) -> int:
+    size = sys.getsizeof(mapping)
+    for key, value in mapping.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+class MemoryGovernor:
+    """Contabiliza o tamanho estimado dos caches registrados e despeja os de menor prioridade ao passar do limite."""
+
+    def __init__(self, budget_bytes: int, registry: Optional[MetricsRegistry] = None):
+        self.budget_bytes = budget_bytes
+        self.registry = registry
+        self.caches: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.evicted_bytes = 0
+
+    def register(
+        self,
+        name: str,
+        size_func: Callable[[], int],
+        evict_func: Optional[Callable[[int], int]] = None,
+        priority: int = 100,
+    ):
+        with self.lock:
+            self.caches[name] = {
+                "size": size_func,
+                "evict": evict_func,
+                "priority": priority,
+            }
+
+    def unregister(self, name: str):
+        with self.lock:
+            self.caches.pop(name, None)
+
+    def usage(self) -> List[tuple]:
+        with self.lock:
+            caches = list(self.caches.items())
+        rows = []
+        for name, cache in caches:
+            try:
+                size = int(cache["size"]())
+            except Exception:
+                size = 0
+            rows.append((name, size, cache["priority"], cache["evict"] is not None))
+        if self.registry:
+            self.registry.replace_gauges(
+                "memory.cache_bytes", [({"cache": row[0]}, row[1]) for row in rows]
+            )
+        return rows
+
+    def total_bytes(self) -> int:
+        return sum(row[1] for row in self.usage())
+
+    def enforce(self) -> List[tuple]:
+        rows = self.usage()
+        excess = sum(row[1] for row in rows) - self.budget_bytes
+        evictions = []
+        if excess <= 0:
+            return evictions
+        for name, size, _, evictable in sorted(rows, key=lambda row: row[2]):
+            if excess <= 0:
+                break
+            if not evictable or size <= 0:
+                continue
+            with self.lock:
+                cache = self.caches.get(name)
+            if not cache:
+                continue
+            freed = int(cache["evict"](excess) or 0)
+            if freed > 0:
+                excess -= freed
+                self.evicted_bytes += freed
+                evictions.append((name, freed))
+                if self.registry:
+                    self.registry.increment(
+                        "memory.evicted_bytes", freed, labels={"cache": name}
+                    )
+        return evictions
+
+
+MEMORY_GOVERNOR = MemoryGovernor(
+    APP_SETTINGS.get_int("MEMORY_BUDGET_MB", 256) * 1024 * 1024, METRICS
+)
+
+
 class LogConsole:
     def __init__(self, master):
         self.master = master
@@ -125,6 +1035,7 @@ class LogConsole:
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.log_text.config(state=tk.DISABLED)
 
+        self.log_text.tag_config("DEBUG", foreground="#6272a4")
         self.log_text.tag_config("INFO", foreground="#8be9fd")
         self.log_text.tag_config("WARNING", foreground="#ffb86c")
         self.log_text.tag_config("ERROR", foreground="#ff5555")
@@ -136,8 +1047,14 @@ class LogConsole:
         self.log_text.config(yscrollcommand=log_scrollbar.set)
         log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        clear_button = ttk.Button(log_frame, text="Limpar Log", command=self.clear_log)
-        clear_button.pack(pady=5)
+        buttons = tk.Frame(log_frame, bg="#34495E")
+        buttons.pack(pady=5)
+        ttk.Button(buttons, text="Limpar Log", command=self.clear_log).pack(
+            side=tk.LEFT, padx=5
+        )
+        ttk.Button(
+            buttons, text="Consultas Lentas", command=self.show_slow_queries
+        ).pack(side=tk.LEFT, padx=5)
 
         self.is_showing = True
         self._process_queue()
@@ -151,18 +1068,22 @@ class LogConsole:
                 self.master.after_cancel(self.after_id)
                 self.after_id = None
 
-    def log_message(self, message, level="INFO", source="DEFAULT"):
-        if len(message) > self.max_log_length:
-            message = message[: self.max_log_length - 3] + "..."
-        timestamp = time.strftime("%H:%M:%S")
-        self.message_queue.put((f"[{timestamp}] {message}", level, source))
+    def log_message(self, message, *args, level="INFO", source="DEFAULT"):
+        if not FILE_LOGGER.is_enabled(level):
+            return
+        FILE_LOGGER.log(message, *args, level=level, source=source)
+        self.message_queue.put((time.time(), message, args, level, source))
         if self.is_showing:
             if not self.after_id:
                 self.after_id = self.master.after(100, self._process_queue)
 
     def _process_queue(self):
         while not self.message_queue.empty():
-            message, level, source = self.message_queue.get_nowait()
+            timestamp, message, args, level, source = self.message_queue.get_nowait()
+            message = format_log_message(message, args)
+            if len(message) > self.max_log_length:
+                message = message[: self.max_log_length - 3] + "..."
+            message = f"[{time.strftime('%H:%M:%S', time.localtime(timestamp))}] {message}"
             if self.log_text:
                 self.log_text.config(state=tk.NORMAL)
                 self.log_text.insert(tk.END, f"[{source}] ", source)
@@ -172,6 +1093,46 @@ class LogConsole:
                 self.log_text.config(state=tk.DISABLED)
         self.after_id = None
 
+    def show_slow_queries(self):
+        window = tk.Toplevel(self.log_window or self.master)
+        window.title("Consultas Lentas")
+        window.geometry("800x500")
+        window.configure(bg="#2C3E50")
+
+        text = tk.Text(
+            window,
+            bg="#2C3E50",
+            fg="#ECF0F1",
+            font=("Consolas", 9),
+            relief="flat",
+            bd=0,
+            wrap=tk.NONE,
+        )
+        scrollbar = ttk.Scrollbar(window, command=text.yview)
+        text.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        text.tag_config("header", foreground="#ffb86c")
+        text.tag_config("plan", foreground="#8be9fd")
+
+        entries = SLOW_QUERIES.recent()
+        if not entries:
+            text.insert(
+                tk.END,
+                f"Nenhuma consulta acima de {SLOW_QUERIES.threshold * 1000:.0f} ms registrada.\n",
+            )
+        for entry in entries:
+            text.insert(
+                tk.END,
+                f"[{entry.get('ts')}] {entry.get('operation')} — {entry.get('duration_ms')} ms\n",
+                "header",
+            )
+            text.insert(tk.END, f"{entry.get('query')}\nParâmetros: {entry.get('params')}\n")
+            if entry.get("plan"):
+                text.insert(tk.END, f"{entry['plan']}\n", "plan")
+            text.insert(tk.END, "\n")
+        text.config(state=tk.DISABLED)
+
     def clear_log(self):
         if self.log_text:
             self.log_text.config(state=tk.NORMAL)
@@ -180,6 +1141,111 @@ class LogConsole:
             self.log_message("Log limpo.", level="INFO", source="UI")
 
 
+class PerformanceWindow:
+    def __init__(self, master, registry: MetricsRegistry, refresh_ms: int = 1000):
+        self.master = master
+        self.registry = registry
+        self.refresh_ms = refresh_ms
+        self.window = None
+        self.latency_tree = None
+        self.values_tree = None
+        self.after_id = None
+
+    def show(self):
+        if self.window and self.window.winfo_exists():
+            self.window.lift()
+            return
+
+        self.window = tk.Toplevel(self.master)
+        self.window.title("Desempenho")
+        self.window.geometry("760x480")
+        self.window.configure(bg="#2C3E50")
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        frame = tk.Frame(self.window, bg="#34495E", relief="solid", bd=1)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        tk.Label(
+            frame,
+            text="Latência por operação (ms):",
+            font=("Tahoma", 10, "bold"),
+            bg="#34495E",
+            fg="#BDC3C7",
+        ).pack(anchor="w", padx=5, pady=(5, 0))
+
+        columns = ("count", "mean", "p50", "p95", "p99", "max")
+        self.latency_tree = ttk.Treeview(frame, columns=columns, height=10)
+        self.latency_tree.heading("#0", text="Operação")
+        self.latency_tree.column("#0", width=220)
+        for column, title in zip(
+            columns, ("Chamadas", "Média", "p50", "p95", "p99", "Máx")
+        ):
+            self.latency_tree.heading(column, text=title)
+            self.latency_tree.column(column, width=80, anchor="e")
+        self.latency_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        tk.Label(
+            frame,
+            text="Contadores e medidores:",
+            font=("Tahoma", 10, "bold"),
+            bg="#34495E",
+            fg="#BDC3C7",
+        ).pack(anchor="w", padx=5, pady=(5, 0))
+
+        self.values_tree = ttk.Treeview(frame, columns=("kind", "value"), height=6)
+        self.values_tree.heading("#0", text="Nome")
+        self.values_tree.column("#0", width=320)
+        self.values_tree.heading("kind", text="Tipo")
+        self.values_tree.column("kind", width=100)
+        self.values_tree.heading("value", text="Valor")
+        self.values_tree.column("value", width=120, anchor="e")
+        self.values_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self._refresh()
+
+    def hide(self):
+        if self.after_id:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        if self.window:
+            self.window.destroy()
+            self.window = None
+
+    def _refresh(self):
+        self.after_id = None
+        if not self.window or not self.window.winfo_exists():
+            return
+        snapshot = self.registry.snapshot()
+
+        self.latency_tree.delete(*self.latency_tree.get_children())
+        for name, summary in sorted(snapshot["histograms"].items()):
+            self.latency_tree.insert(
+                "",
+                tk.END,
+                text=name,
+                values=(
+                    summary["count"],
+                    f"{summary['mean'] * 1000:.1f}",
+                    f"{summary['p50'] * 1000:.1f}",
+                    f"{summary['p95'] * 1000:.1f}",
+                    f"{summary['p99'] * 1000:.1f}",
+                    f"{summary['max'] * 1000:.1f}",
+                ),
+            )
+
+        self.values_tree.delete(*self.values_tree.get_children())
+        for name, value in sorted(snapshot["counters"].items()):
+            self.values_tree.insert(
+                "", tk.END, text=name, values=("contador", f"{value:g}")
+            )
+        for name, value in sorted(snapshot["gauges"].items()):
+            self.values_tree.insert(
+                "", tk.END, text=name, values=("medidor", f"{value:g}")
+            )
+
+        self.after_id = self.master.after(self.refresh_ms, self._refresh)
+
+
 class RegistryManager:
     def __init__(self, app_name="StoreManager", key_name="GrandFantasiaPath"):
         self.app_name = app_name
@@ -235,18 +1301,2027 @@ class DirectoryValidator:
         return True
 
 
+class PreparedStatementCache:
+    """Faz PREPARE de cada consulta distinta uma vez por conexão e depois só EXECUTE."""
+
+    _PLACEHOLDER = re.compile(r"%%|%s")
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.statements: Dict[str, tuple] = {}
+        self.prepared: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def _statement(self, query: str) -> tuple:
+        with self.lock:
+            entry = self.statements.get(query)
+            if entry is None:
+                name = f"shop_stmt_{len(self.statements) + 1}"
+                labels = {"statement": name, "query": " ".join(query.split())[:60]}
+                param_count = sum(
+                    m.group() == "%s" for m in self._PLACEHOLDER.finditer(query)
+                )
+                counter = iter(range(1, param_count + 1))
+                body = self._PLACEHOLDER.sub(
+                    lambda m: "%" if m.group() == "%%" else f"${next(counter)}", query
+                ).strip().rstrip(";")
+                entry = (name, labels, param_count, body)
+                self.statements[query] = entry
+        return entry
+
+    def execute(self, cursor, query: str, params=None):
+        name, labels, param_count, body = self._statement(query)
+        with METRICS.timer("db.statement", labels):
+            if not self.enabled:
+                cursor.execute(query, params)
+                return
+            conn = cursor.connection
+            with self.lock:
+                prepared = self.prepared.setdefault(conn, set())
+            if name not in prepared:
+                cursor.execute(f"PREPARE {name} AS {body};")
+                prepared.add(name)
+                METRICS.increment("db.statement.prepares", labels=labels)
+            placeholders = f" ({', '.join(['%s'] * param_count)})" if param_count else ""
+            try:
+                cursor.execute(f"EXECUTE {name}{placeholders};", params)
+            except InvalidSqlStatementName:
+                # A sessão perdeu as instruções (ex.: DISCARD ALL); a próxima chamada prepara de novo.
+                self.forget(conn)
+                raise
+
+    def forget(self, conn):
+        with self.lock:
+            self.prepared.pop(conn, None)
+
+
+class SlowQueryLog:
+    """Grava as consultas que passam de 'threshold_ms', com EXPLAIN opcional, num arquivo JSON-lines próprio."""
+
+    def __init__(self, writer: StructuredLogger, threshold_ms: int = 500, explain: bool = False):
+        self.writer = writer
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self.log: Callable = FILE_LOGGER.log
+        self.context = threading.local()
+
+    @contextmanager
+    def operation(self, name: str):
+        """Identifica, na thread atual, a operação a que as consultas lentas pertencem."""
+        previous = getattr(self.context, "operation", None)
+        self.context.operation = name
+        try:
+            yield
+        finally:
+            self.context.operation = previous
+
+    def is_slow(self, elapsed: float) -> bool:
+        return self.threshold > 0 and elapsed >= self.threshold
+
+    @classmethod
+    def redact(cls, params):
+        if isinstance(params, (list, tuple)):
+            return [cls.redact(value) for value in params]
+        if isinstance(params, str):
+            return f"<texto {len(params)}>"
+        return params
+
+    def capture(self, conn, query: str, params, elapsed: float):
+        operation = getattr(self.context, "operation", None) or "?"
+        text = " ".join(query.split())
+        plan = self._explain(conn, query, params) if self.explain else None
+        METRICS.increment("db.slow_queries", labels={"operation": operation})
+        self.writer.log(
+            "Consulta lenta em %s (%.0f ms)",
+            operation,
+            elapsed * 1000,
+            level="WARNING",
+            source="DB",
+            operation=operation,
+            duration_ms=round(elapsed * 1000, 1),
+            query=text,
+            params=self.redact(params),
+            plan=plan,
+        )
+        self.log(
+            "Consulta lenta em %s (%.0f ms): %s",
+            operation,
+            elapsed * 1000,
+            text[:200],
+            level="WARNING",
+            source="DB",
+        )
+
+    def _explain(self, conn, query: str, params) -> str:
+        query = query.strip().rstrip(";")
+        if ";" in query:
+            return "EXPLAIN omitido: várias instruções no mesmo envio."
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SAVEPOINT slow_query_explain;")
+                try:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query};", params)
+                    return "\n".join(row[0] for row in cursor.fetchall())
+                finally:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain;")
+        except PgError as e:
+            # Sem o savepoint desfeito a transação da operação estaria perdida.
+            if conn.info.transaction_status == TRANSACTION_STATUS_INERROR:
+                raise
+            return f"EXPLAIN indisponível: {e}"
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        """As últimas 'limit' entradas do arquivo atual, da mais nova para a mais antiga."""
+        try:
+            with open(self.writer.file_path, encoding="utf-8") as stream:
+                lines = deque(stream, maxlen=limit)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+
+SLOW_QUERIES = SlowQueryLog(
+    StructuredLogger(
+        FILE_LOGGER.log_dir,
+        file_name="slow_queries.log",
+        max_bytes=FILE_LOGGER.max_bytes,
+        backup_count=FILE_LOGGER.backup_count,
+    ),
+    threshold_ms=APP_SETTINGS.get_int("SLOW_QUERY_MS", 500),
+    explain=APP_SETTINGS.get_bool("SLOW_QUERY_EXPLAIN", False),
+)
+
+
+class DatabasePool:
+    """Conexões psycopg2 por papel, com timeouts, réplica opcional para leituras e reconexão com backoff."""
+
+    DISCONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+    # (statement_timeout, lock_timeout) em ms por papel.
+    DEFAULT_TIMEOUTS = {"read": (30000, 5000), "write": (10000, 3000), "bulk": (0, 10000)}
+    # Falha de serialização, deadlock e lock_timeout: a transação foi desfeita por inteiro.
+    RETRYABLE_SQLSTATES = ("40001", "40P01", "55P03")
+
+    def __init__(
+        self,
+        connect_params: Dict,
+        max_idle_per_role: int = 2,
+        validate_after: float = 5.0,
+        max_attempts: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        prepare_statements: bool = True,
+        replica_params: Optional[Dict] = None,
+        replica_max_wait: float = 2.0,
+        replica_retry_after: float = 30.0,
+        timeouts: Optional[Dict[str, tuple]] = None,
+        retry_attempts: int = 3,
+        retry_delay: float = 0.2,
+    ):
+        self.connect_params = dict(connect_params)
+        self.replica_params = dict(replica_params) if replica_params else None
+        self.replica_max_wait = replica_max_wait
+        self.replica_retry_after = replica_retry_after
+        self.replica_down_until = 0.0
+        self.write_lsn = 0
+        self.replica_lsn = 0
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retry_attempts = max(1, retry_attempts)
+        self.retry_delay = retry_delay
+        self.active: Dict[int, object] = {}
+        self.max_idle_per_role = max_idle_per_role
+        self.validate_after = validate_after
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle: Dict[str, List[tuple]] = {}
+        self.in_use = 0
+        self.lock = threading.Lock()
+        self.log: Callable = FILE_LOGGER.log
+        self.statements = PreparedStatementCache(enabled=prepare_statements)
+
+    def adopt(self, conn, role: str = "write"):
+        self._apply_timeouts(conn, role)
+        self.checkin(role, conn)
+
+    def _apply_timeouts(self, conn, role: str):
+        statement, lock = self.timeouts.get(role.partition("-")[0], (0, 0))
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SET statement_timeout = %s; SET lock_timeout = %s;", (statement, lock)
+            )
+        conn.commit()
+
+    @classmethod
+    def is_disconnect(cls, error: Exception) -> bool:
+        """Perda da conexão, e não um erro do servidor numa conexão que continua válida."""
+        if isinstance(error, psycopg2.InterfaceError):
+            return True
+        if not isinstance(error, psycopg2.OperationalError):
+            return False
+        code = error.pgcode
+        return code is None or code.startswith("08") or code.startswith("57P")
+
+    def _connect(self, role: str = "write"):
+        params = self.connect_params
+        max_attempts = self.max_attempts
+        if role == "read" and self.replica_params:
+            # O primário está ali como alternativa: não vale esperar pela réplica.
+            params, max_attempts = self.replica_params, 1
+        delay = self.backoff_base
+        last_error = None
+        for attempt in range(1, max_attempts + 1):
+            try:
+                conn = psycopg2.connect(**params)
+                self._apply_timeouts(conn, role)
+                METRICS.increment("db.pool.connects")
+                if attempt > 1:
+                    self.log(
+                        "Reconectado ao banco de dados após %d tentativas.",
+                        attempt,
+                        level="INFO",
+                        source="DB",
+                    )
+                return conn
+            except psycopg2.OperationalError as e:
+                last_error = e
+                METRICS.increment("db.pool.connect_failures")
+                if attempt == max_attempts:
+                    break
+                wait = delay + random.uniform(0, delay / 2)
+                self.log(
+                    "Falha ao conectar ao DB (tentativa %d/%d), nova tentativa em %.1f s: %s",
+                    attempt,
+                    max_attempts,
+                    wait,
+                    e,
+                    level="WARNING",
+                    source="DB",
+                )
+                time.sleep(wait)
+                delay = min(delay * 2, self.backoff_max)
+        raise last_error
+
+    def open_dedicated(self):
+        """Abre uma conexão fora do pool (ex.: LISTEN), com o mesmo backoff."""
+        return self._connect()
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except self.DISCONNECT_ERRORS:
+            return False
+
+    def checkout(self, role: str = "write"):
+        while True:
+            with self.lock:
+                idle = self.idle.get(role)
+                entry = idle.pop() if idle else None
+            if entry is None:
+                conn = self._connect(role)
+                break
+            conn, idle_since = entry
+            if self._is_healthy(conn, idle_since):
+                break
+            METRICS.increment("db.pool.discarded")
+            self._close_quietly(conn)
+        with self.lock:
+            self.in_use += 1
+            self.active[id(conn)] = conn
+        return conn
+
+    def checkin(self, role: str, conn, broken: bool = False):
+        with self.lock:
+            if self.in_use > 0:
+                self.in_use -= 1
+            self.active.pop(id(conn), None)
+        if not broken and not conn.closed:
+            try:
+                if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except self.DISCONNECT_ERRORS:
+                broken = True
+        if not broken and self.replica_params and not role.startswith("read"):
+            broken = not self._note_write_position(conn)
+        if broken or conn.closed:
+            self._close_quietly(conn)
+            return
+        with self.lock:
+            idle = self.idle.setdefault(role, [])
+            if len(idle) < self.max_idle_per_role:
+                idle.append((conn, time.monotonic()))
+                return
+        self._close_quietly(conn)
+
+    def _note_write_position(self, conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_current_wal_lsn() - '0/0'::pg_lsn;")
+                position = int(cursor.fetchone()[0])
+            conn.rollback()
+        except self.DISCONNECT_ERRORS:
+            return False
+        with self.lock:
+            self.write_lsn = max(self.write_lsn, position)
+        return True
+
+    def _replica_caught_up(self, conn) -> bool:
+        started = time.monotonic()
+        while True:
+            target = self.write_lsn
+            if self.replica_lsn >= target:
+                return True
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn() - '0/0'::pg_lsn;"
+                )
+                in_recovery, replayed = cursor.fetchone()
+            conn.rollback()
+            waited = time.monotonic() - started
+            if not in_recovery or (replayed is not None and replayed >= target):
+                with self.lock:
+                    self.replica_lsn = max(self.replica_lsn, target)
+                METRICS.observe("db.replica.wait", waited)
+                return True
+            if waited >= self.replica_max_wait:
+                METRICS.increment("db.replica.fallbacks")
+                self.log(
+                    "Réplica ainda não reproduziu a última escrita local (%.1f s); lendo do primário.",
+                    waited,
+                    level="WARNING",
+                    source="DB",
+                )
+                return False
+            time.sleep(0.02)
+
+    def _checkout_read(self) -> tuple:
+        """(papel, conexão) para uma leitura que enxerga as escritas locais já confirmadas."""
+        if time.monotonic() < self.replica_down_until:
+            METRICS.increment("db.replica.fallbacks")
+            return "read-primary", self.checkout("read-primary")
+        try:
+            conn = self.checkout("read")
+        except self.DISCONNECT_ERRORS as e:
+            METRICS.increment("db.replica.fallbacks")
+            with self.lock:
+                self.replica_down_until = time.monotonic() + self.replica_retry_after
+            self.log(
+                "Réplica inacessível, lendo do primário pelos próximos %.0f s: %s",
+                self.replica_retry_after,
+                e,
+                level="WARNING",
+                source="DB",
+            )
+            return "read-primary", self.checkout("read-primary")
+        try:
+            caught_up = self._replica_caught_up(conn)
+        except self.DISCONNECT_ERRORS:
+            self.checkin("read", conn, broken=True)
+            caught_up = False
+        else:
+            if not caught_up:
+                self.checkin("read", conn)
+        if caught_up:
+            return "read", conn
+        return "read-primary", self.checkout("read-primary")
+
+    @contextmanager
+    def connection(self, role: str = "write"):
+        if role == "read" and self.replica_params:
+            role, conn = self._checkout_read()
+        else:
+            conn = self.checkout(role)
+        broken = False
+        try:
+            yield conn
+        except Exception as e:
+            broken = self.is_disconnect(e) or conn.closed
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except self.DISCONNECT_ERRORS:
+                    broken = True
+            raise
+        finally:
+            self.checkin(role, conn, broken)
+
+    def run(self, role: str, func: Callable, retry: bool = False):
+        """Roda func(conn) repetindo erros transitórios; a perda da conexão só é repetida com retry=True."""
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                with self.connection(role) as conn:
+                    return func(conn)
+            except PgError as e:
+                disconnected = self.is_disconnect(e)
+                if attempt == self.retry_attempts or not (
+                    e.pgcode in self.RETRYABLE_SQLSTATES or (retry and disconnected)
+                ):
+                    raise
+                # Espera com jitter completo: sessões concorrentes não repetem juntas.
+                wait = random.uniform(
+                    0, min(self.retry_delay * 2 ** (attempt - 1), self.backoff_max)
+                )
+                METRICS.increment(
+                    "db.retries", labels={"role": role, "error": e.pgcode or "disconnect"}
+                )
+                self.log(
+                    "%s; nova tentativa (%d/%d) em %.2f s: %s",
+                    "Conexão perdida durante a operação" if disconnected else "Erro transitório no DB",
+                    attempt + 1,
+                    self.retry_attempts,
+                    wait,
+                    e,
+                    level="WARNING",
+                    source="DB",
+                )
+                time.sleep(wait)
+
+    def cancel_active(self) -> int:
+        """Pede ao servidor que cancele a instrução em execução em cada conexão emprestada."""
+        with self.lock:
+            connections = list(self.active.values())
+        cancelled = 0
+        for conn in connections:
+            try:
+                conn.cancel()
+                cancelled += 1
+            except PgError:
+                continue
+        return cancelled
+
+    def close_all(self):
+        with self.lock:
+            entries = [entry for idle in self.idle.values() for entry in idle]
+            self.idle = {}
+        for conn, _ in entries:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class SqlStatementReader:
+    """Lê instruções SQL de um arquivo em blocos, respeitando strings, dollar-quoting e comentários."""
+
+    CHUNK_SIZE = 64 * 1024
+    LOOKAHEAD = 64
+    _TOKEN = re.compile(r"[;'\"$]|--|/\*")
+    _DOLLAR_TAG = re.compile(r"\$(?:[^\W\d]\w*)?\$")
+    _BLOCK_COMMENT = re.compile(r"/\*|\*/")
+    _ESCAPED_QUOTE = re.compile(r"\\[\s\S]|'")
+
+    def __init__(self, stream, chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.chars_read = 0
+        self.eof = False
+
+    @staticmethod
+    def _is_word_char(char: str) -> bool:
+        return char.isalnum() or char in "_$"
+
+    def __iter__(self):
+        parts: List[str] = []
+        buf = ""
+        pos = seg = 0
+
+        def refill(keep: bool = True) -> bool:
+            # Descarta o que já foi varrido; buf[seg:pos] vai para a instrução se 'keep'.
+            nonlocal buf, pos, seg
+            if self.eof:
+                return False
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self.eof = True
+                return False
+            self.chars_read += len(chunk)
+            if keep:
+                parts.append(buf[seg:pos])
+            buf = buf[pos:] + chunk
+            pos = seg = 0
+            return True
+
+        while True:
+            match = self._TOKEN.search(buf, pos)
+            if match is None:
+                pos = max(pos, len(buf) - 1)
+                if refill():
+                    continue
+                break
+            start = match.start()
+            if match.end() + self.LOOKAHEAD > len(buf) and not self.eof:
+                pos = max(pos, start - 2)
+                refill()
+                continue
+
+            token = match.group()
+            if token == ";":
+                parts.append(buf[seg:start])
+                statement = "".join(parts).strip()
+                parts = []
+                pos = seg = start + 1
+                if statement:
+                    yield statement
+
+            elif token == "--":
+                parts.append(buf[seg:start] + " ")
+                pos = seg = start
+                while True:
+                    end = buf.find("\n", pos)
+                    if end >= 0:
+                        pos = seg = end
+                        break
+                    pos = len(buf)
+                    if not refill(keep=False):
+                        seg = pos
+                        break
+
+            elif token == "/*":
+                parts.append(buf[seg:start] + " ")
+                seg = start
+                pos = start + 2
+                depth = 1
+                while depth:
+                    marker = self._BLOCK_COMMENT.search(buf, pos)
+                    if marker is None:
+                        pos = max(pos, len(buf) - 1)
+                        if not refill(keep=False):
+                            raise ValueError("Comentário /* sem fechamento no arquivo SQL.")
+                        continue
+                    depth += 1 if marker.group() == "/*" else -1
+                    pos = marker.end()
+                seg = pos
+
+            elif token == "$":
+                tag = self._DOLLAR_TAG.match(buf, start)
+                if tag is None or (start > 0 and self._is_word_char(buf[start - 1])):
+                    pos = start + 1
+                    continue
+                delimiter = tag.group()
+                pos = tag.end()
+                while True:
+                    end = buf.find(delimiter, pos)
+                    if end >= 0:
+                        pos = end + len(delimiter)
+                        break
+                    pos = max(pos, len(buf) - len(delimiter) + 1)
+                    if not refill():
+                        raise ValueError(f"Bloco {delimiter} sem fechamento no arquivo SQL.")
+
+            else:
+                escaped = (
+                    token == "'"
+                    and start > 0
+                    and buf[start - 1] in "eE"
+                    and not (start > 1 and self._is_word_char(buf[start - 2]))
+                )
+                pos = start + 1
+                while True:
+                    if escaped:
+                        found = self._ESCAPED_QUOTE.search(buf, pos)
+                        end = found.start() if found else -1
+                        if found and found.group() != "'":
+                            pos = found.end()
+                            continue
+                    else:
+                        end = buf.find(token, pos)
+                    if end < 0 or (end + 1 >= len(buf) and not self.eof):
+                        pos = max(pos, len(buf) - 1) if end < 0 else end
+                        if not refill():
+                            raise ValueError("String sem fechamento no arquivo SQL.")
+                        continue
+                    if buf.startswith(token, end + 1):
+                        pos = end + 2
+                        continue
+                    pos = end + 1
+                    break
+
+        parts.append(buf[seg:])
+        statement = "".join(parts).strip()
+        if statement:
+            yield statement
+
+
+_INSERT_VALUES = re.compile(
+    r"(INSERT\s+INTO\s+[^(]+?(?:\([^)]*\)\s*)?VALUES)\s*(\(.*\))", re.IGNORECASE | re.DOTALL
+)
+_VALUES_TOKEN = re.compile(
+    r"(?<![\w$])[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[()$]", re.DOTALL
+)
+
+
+def _is_single_row(values: str) -> bool:
+    """Se 'values' é uma única tupla (...) sem nada depois dela (ON CONFLICT, RETURNING, outra linha)."""
+    depth = 0
+    for token in _VALUES_TOKEN.finditer(values):
+        text = token.group()
+        if text == "$":
+            # Dollar-quoting ou parâmetros: não arrisca juntar.
+            return False
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+            if depth == 0:
+                return token.end() == len(values)
+    return False
+
+
+def batch_insert_statements(statements, max_rows: int = 500):
+    """Agrupa INSERTs consecutivos na mesma tabela; gera (sql, quantidade de instruções originais)."""
+    prefix = None
+    rows: List[str] = []
+    for statement in statements:
+        match = _INSERT_VALUES.fullmatch(statement)
+        if match and not _is_single_row(match.group(2)):
+            match = None
+        if match and match.group(1) == prefix and len(rows) < max_rows:
+            rows.append(match.group(2))
+            continue
+        if rows:
+            yield f"{prefix} {', '.join(rows)}", len(rows)
+            prefix, rows = None, []
+        if match:
+            prefix, rows = match.group(1), [match.group(2)]
+        else:
+            yield statement, 1
+    if rows:
+        yield f"{prefix} {', '.join(rows)}", len(rows)
+
+
+def copy_text_value(value) -> str:
+    """Formata um valor para o formato texto do COPY (tab como separador)."""
+    if value is None:
+        return "\\N"
+    text = str(value)
+    if isinstance(value, str):
+        text = (
+            text.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return text
+
+
+def items_copy_buffer(items_list: List[ItemMall]) -> io.StringIO:
+    buffer = io.StringIO()
+    for item in items_list:
+        buffer.write("\t".join(copy_text_value(v) for v in item.values()))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+# Impressão digital barata por faixa (categoria, moeda): quantidade de linhas e
+# soma do hash de cada linha. Só trafegam algumas dezenas de linhas de resultado.
+ITEMMALL_FINGERPRINT_QUERY = """
+    SELECT item_group, money_unit, count(*), sum(hashtext(t::text))
+    FROM public.itemmall t
+    GROUP BY item_group, money_unit;
+"""
+
+ITEMMALL_KEY_COLUMNS = ("item_id", "item_group", "item_index", "money_unit")
+# Mesmas colunas da chave, na ordem que também atende à busca da posição
+# (categoria, moeda, índice), ao maior índice da faixa e à paginação.
+ITEMMALL_PRIMARY_KEY = ("item_group", "money_unit", "item_index", "item_id")
+# Consultas frequentes e as colunas que elas filtram por igualdade.
+ITEMMALL_HOT_QUERIES = (
+    ("Alterar/excluir item pela chave", set(ITEMMALL_KEY_COLUMNS)),
+    (
+        "Verificar posição ocupada (categoria, índice, moeda)",
+        {"item_group", "item_index", "money_unit"},
+    ),
+    ("Maior índice e páginas de uma categoria/moeda", {"item_group", "money_unit"}),
+)
+
+_INSERT_TARGET = re.compile(
+    r"INSERT\s+INTO\s+(?P<table>[^(]+?)\s*(?P<columns>\([^)]*\))?\s*VALUES",
+    re.IGNORECASE | re.DOTALL,
+)
+_ITEMMALL_TABLE = r'(?:"?public"?\s*\.\s*)?"?itemmall"?'
+_ITEMMALL_DDL = re.compile(
+    rf"(?:DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?|CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    rf"|ALTER\s+TABLE\s+(?:ONLY\s+)?)"
+    rf"{_ITEMMALL_TABLE}(?![\w.])",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class ItemChangeSet:
+    insert_count: int
+    update_count: int
+    delete_count: int
+    samples: List[tuple]
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.insert_count or self.update_count or self.delete_count)
+
+
+@dataclass
+class SchemaReport:
+    # (descrição da consulta, índice que a atende ou None)
+    coverage: List[tuple]
+    has_primary_key: bool
+    duplicate_keys: int
+
+    @property
+    def can_create_primary_key(self) -> bool:
+        return not self.has_primary_key and self.duplicate_keys == 0
+
+
+@dataclass
+class StagedEntry:
+    item: ItemMall
+    original: Optional[tuple]
+    deleted: bool = False
+
+
+class StagedChangeSet:
+    """Edições, inclusões e exclusões guardadas localmente, com os valores originais, até o commit ou descarte."""
+
+    def __init__(self):
+        self.entries: Dict[int, StagedEntry] = {}
+
+    def remember(self, item: ItemMall):
+        if id(item) not in self.entries:
+            self.entries[id(item)] = StagedEntry(item, item.values())
+
+    def add(self, item: ItemMall):
+        self.entries[id(item)] = StagedEntry(item, None)
+
+    def delete(self, item: ItemMall):
+        self.remember(item)
+        entry = self.entries[id(item)]
+        if entry.original is None:
+            del self.entries[id(item)]
+        else:
+            entry.deleted = True
+
+    def is_dirty(self, item: ItemMall) -> bool:
+        entry = self.entries.get(id(item))
+        return entry is not None and self._entry_dirty(entry)
+
+    @staticmethod
+    def _entry_dirty(entry: StagedEntry) -> bool:
+        return entry.original is None or entry.deleted or entry.original != entry.item.values()
+
+    def pending(self) -> tuple:
+        inserts, updates, deletes = [], [], []
+        for entry in self.entries.values():
+            if entry.original is None:
+                inserts.append(entry)
+            elif entry.deleted:
+                deletes.append(entry)
+            elif entry.original != entry.item.values():
+                updates.append(entry)
+        return inserts, updates, deletes
+
+    def keys(self) -> set:
+        keys = set()
+        for entry in self.entries.values():
+            keys.add(entry.item.key)
+            if entry.original is not None:
+                keys.add(ItemMall(*entry.original).key)
+        return keys
+
+    def __len__(self) -> int:
+        return sum(1 for entry in self.entries.values() if self._entry_dirty(entry))
+
+    def settle(self, written: Dict[int, tuple]):
+        """Marca como gravado o que um commit enviou; o que mudou depois dele continua pendente."""
+        for key, (entry, values) in written.items():
+            current = self.entries.get(key)
+            if values is None:
+                if current is entry:
+                    del self.entries[key]
+            elif current is None:
+                # Item novo excluído enquanto o commit estava em andamento.
+                self.entries[key] = StagedEntry(entry.item, values, deleted=True)
+            elif not current.deleted and current.item.values() == values:
+                del self.entries[key]
+            else:
+                current.original = values
+
+    def clear(self):
+        self.entries = {}
+
+
+class ItemPageCache:
+    """Páginas de itemmall buscadas no servidor, por faixa (categoria, moeda), em LRU."""
+
+    def __init__(self, max_pages: int = 64):
+        self.max_pages = max(1, max_pages)
+        self.pages: "OrderedDict[tuple, List[ItemMall]]" = OrderedDict()
+        self.stats: Dict[tuple, tuple] = {}
+        self.generation = 0
+
+    def get(self, range_key: tuple, page: int) -> Optional[List[ItemMall]]:
+        items = self.pages.get((range_key, page))
+        if items is not None:
+            self.pages.move_to_end((range_key, page))
+        return items
+
+    def put(self, range_key: tuple, page: int, items: List[ItemMall]):
+        self.pages[(range_key, page)] = items
+        self.pages.move_to_end((range_key, page))
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+
+    def bounds(self, range_key: tuple, page: int) -> tuple:
+        """(after, before): chaves das páginas vizinhas em cache para buscar 'page' por chave."""
+        previous = self.pages.get((range_key, page - 1))
+        following = self.pages.get((range_key, page + 1))
+        after = (previous[-1].item_index, previous[-1].item_id) if previous else None
+        before = (following[0].item_index, following[0].item_id) if following else None
+        return after, before
+
+    def items(self) -> List[ItemMall]:
+        return [item for items in self.pages.values() for item in items]
+
+    def clear(self):
+        self.pages.clear()
+        self.stats.clear()
+        self.generation += 1
+
+
+class ItemMallSync:
+    """Leva public.itemmall a um conjunto desejado de linhas aplicando só a diferença."""
+
+    STAGING_TABLE = "itemmall_sync"
+    PREVIEW_LIMIT = 500
+
+    _KEY_MATCH = " AND ".join(f"s.{c} = t.{c}" for c in ITEMMALL_KEY_COLUMNS)
+    _VALUE_COLUMNS = tuple(c for c in ITEMMALL_COLUMNS if c not in ITEMMALL_KEY_COLUMNS)
+    _CHANGED = "({}) IS DISTINCT FROM ({})".format(
+        ", ".join(f"s.{c}" for c in _VALUE_COLUMNS),
+        ", ".join(f"t.{c}" for c in _VALUE_COLUMNS),
+    )
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.skipped_statements = 0
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE {self.STAGING_TABLE} (LIKE public.itemmall) ON COMMIT DROP;"
+            )
+
+    def load_items(self, items_list: List[ItemMall]):
+        with self.conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {self.STAGING_TABLE} ({ITEMMALL_COLUMN_LIST}) FROM STDIN",
+                items_copy_buffer(items_list),
+            )
+
+    def load_statements(self, statements, batch_rows: int = 500) -> int:
+        """Carrega os INSERTs de itemmall de um script; o DROP/CREATE da tabela é ignorado."""
+        loaded = 0
+        with self.conn.cursor() as cursor:
+            for sql, count in batch_insert_statements(
+                self._staging_statements(statements), batch_rows
+            ):
+                cursor.execute(sql)
+                loaded += count
+        return loaded
+
+    def _staging_statements(self, statements):
+        for statement in statements:
+            target = _INSERT_TARGET.match(statement)
+            if target and re.fullmatch(_ITEMMALL_TABLE, target.group("table").strip()):
+                columns = target.group("columns") or ""
+                yield (
+                    f"INSERT INTO {self.STAGING_TABLE} {columns} VALUES"
+                    f"{statement[target.end():]}"
+                )
+            elif not _ITEMMALL_DDL.match(statement):
+                self.skipped_statements += 1
+
+    def preview(self) -> ItemChangeSet:
+        select_columns = ", ".join(f"{{0}}.{c}" for c in ITEMMALL_COLUMNS)
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT
+                    (SELECT count(*) FROM {self.STAGING_TABLE} s WHERE NOT EXISTS
+                        (SELECT 1 FROM public.itemmall t WHERE {self._KEY_MATCH})),
+                    (SELECT count(*) FROM {self.STAGING_TABLE} s JOIN public.itemmall t
+                        ON {self._KEY_MATCH} WHERE {self._CHANGED}),
+                    (SELECT count(*) FROM public.itemmall t WHERE NOT EXISTS
+                        (SELECT 1 FROM {self.STAGING_TABLE} s WHERE {self._KEY_MATCH}));
+                """
+            )
+            insert_count, update_count, delete_count = cursor.fetchone()
+
+            samples = []
+            cursor.execute(
+                f"""
+                SELECT {select_columns.format("s")} FROM {self.STAGING_TABLE} s
+                WHERE NOT EXISTS (SELECT 1 FROM public.itemmall t WHERE {self._KEY_MATCH})
+                LIMIT {self.PREVIEW_LIMIT};
+                """
+            )
+            samples.extend(("INSERT", row, ()) for row in cursor.fetchall())
+            cursor.execute(
+                f"""
+                SELECT {select_columns.format("s")}, {select_columns.format("t")}
+                FROM {self.STAGING_TABLE} s JOIN public.itemmall t ON {self._KEY_MATCH}
+                WHERE {self._CHANGED}
+                LIMIT {self.PREVIEW_LIMIT};
+                """
+            )
+            width = len(ITEMMALL_COLUMNS)
+            for row in cursor.fetchall():
+                new, old = row[:width], row[width:]
+                changed = tuple(
+                    (column, before, after)
+                    for column, before, after in zip(ITEMMALL_COLUMNS, old, new)
+                    if before != after
+                )
+                samples.append(("UPDATE", new, changed))
+            cursor.execute(
+                f"""
+                SELECT {select_columns.format("t")} FROM public.itemmall t
+                WHERE NOT EXISTS (SELECT 1 FROM {self.STAGING_TABLE} s WHERE {self._KEY_MATCH})
+                LIMIT {self.PREVIEW_LIMIT};
+                """
+            )
+            samples.extend(("DELETE", row, ()) for row in cursor.fetchall())
+        return ItemChangeSet(insert_count, update_count, delete_count, samples)
+
+    def apply(self) -> ItemChangeSet:
+        """Aplica DELETE/UPDATE/INSERT mínimos; a diferença é recalculada sob lock."""
+        assignments = ", ".join(f"{c} = s.{c}" for c in self._VALUE_COLUMNS)
+        with self.conn.cursor() as cursor:
+            cursor.execute("LOCK TABLE public.itemmall IN SHARE ROW EXCLUSIVE MODE;")
+            cursor.execute(
+                f"""
+                DELETE FROM public.itemmall t WHERE NOT EXISTS
+                    (SELECT 1 FROM {self.STAGING_TABLE} s WHERE {self._KEY_MATCH});
+                """
+            )
+            deleted = cursor.rowcount
+            cursor.execute(
+                f"""
+                UPDATE public.itemmall t SET {assignments}
+                FROM {self.STAGING_TABLE} s
+                WHERE {self._KEY_MATCH} AND {self._CHANGED};
+                """
+            )
+            updated = cursor.rowcount
+            cursor.execute(
+                f"""
+                INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST})
+                SELECT {ITEMMALL_COLUMN_LIST} FROM {self.STAGING_TABLE} s
+                WHERE NOT EXISTS (SELECT 1 FROM public.itemmall t WHERE {self._KEY_MATCH});
+                """
+            )
+            inserted = cursor.rowcount
+        return ItemChangeSet(inserted, updated, deleted, [])
+
+
+ITEMMALL_CHANGE_CHANNEL = "itemmall_changes"
+
+ITEMMALL_CHANGE_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION public.itemmall_notify_change() RETURNS trigger AS $$
+DECLARE
+    payload text;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('{ITEMMALL_CHANGE_CHANNEL}', json_build_object('op', TG_OP)::text);
+        RETURN NULL;
+    END IF;
+    payload := json_build_object(
+        'op', TG_OP,
+        'old', CASE WHEN TG_OP <> 'INSERT' THEN json_build_array(
+            OLD.item_id, OLD.item_group, OLD.item_index, OLD.money_unit) END,
+        'new', CASE WHEN TG_OP <> 'DELETE' THEN row_to_json(NEW) END
+    )::text;
+    IF octet_length(payload) > 7900 THEN
+        -- Acima do limite do NOTIFY: o ouvinte busca a linha pela chave.
+        payload := json_build_object(
+            'op', TG_OP,
+            'old', CASE WHEN TG_OP <> 'INSERT' THEN json_build_array(
+                OLD.item_id, OLD.item_group, OLD.item_index, OLD.money_unit) END,
+            'key', CASE WHEN TG_OP <> 'DELETE' THEN json_build_array(
+                NEW.item_id, NEW.item_group, NEW.item_index, NEW.money_unit) END
+        )::text;
+    END IF;
+    PERFORM pg_notify('{ITEMMALL_CHANGE_CHANNEL}', payload);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS itemmall_notify_change ON public.itemmall;
+CREATE TRIGGER itemmall_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON public.itemmall
+    FOR EACH ROW EXECUTE FUNCTION public.itemmall_notify_change();
+
+DROP TRIGGER IF EXISTS itemmall_notify_truncate ON public.itemmall;
+CREATE TRIGGER itemmall_notify_truncate
+    AFTER TRUNCATE ON public.itemmall
+    FOR EACH STATEMENT EXECUTE FUNCTION public.itemmall_notify_change();
+"""
+
+
+# O lock consultivo serializa inserções na mesma categoria/moeda até o fim da
+# transação, então o índice livre escolhido não colide com outro administrador.
+# O retorno é declarado coluna a coluna para a função não depender do tipo da
+# tabela, que os dumps apagam e recriam; pelo mesmo motivo o INSERT nomeia as colunas.
+ITEMMALL_INSERT_FUNCTION_BODY = f"""
+#variable_conflict use_column
+BEGIN
+    PERFORM pg_advisory_xact_lock(
+        hashtext('public.itemmall'), hashtext(p_item_group || ':' || p_money_unit)
+    );
+    IF EXISTS (
+        SELECT 1 FROM public.itemmall
+        WHERE item_group = p_item_group AND item_index = p_item_index
+          AND money_unit = p_money_unit
+    ) THEN
+        SELECT coalesce(max(item_index), 0) + 1 INTO p_item_index
+        FROM public.itemmall
+        WHERE item_group = p_item_group AND money_unit = p_money_unit;
+    END IF;
+    RETURN QUERY
+    INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST}) VALUES (
+        p_item_id, p_item_group, p_item_index, p_item_num, p_money_unit, p_point,
+        p_special_price, p_sell, p_on_sell_date, p_not_sell_date,
+        p_account_num_limit, p_recognized_percentage, p_fortune_bag,
+        p_allow_buy_level, p_new_account_day_limit, p_note
+    )
+    RETURNING {", ".join(f"itemmall.{column}" for column in ITEMMALL_COLUMNS)};
+END;
+"""
+ITEMMALL_INSERT_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION public.itemmall_insert_item(
+    p_item_id int4, p_item_group int4, p_item_index int4, p_item_num int4,
+    p_money_unit int4, p_point int4, p_special_price int4, p_sell int4,
+    p_on_sell_date int4, p_not_sell_date int4, p_account_num_limit int4,
+    p_recognized_percentage float8, p_fortune_bag text, p_allow_buy_level int4,
+    p_new_account_day_limit int4, p_note text
+) RETURNS TABLE (
+    item_id int4, item_group int4, item_index int4, item_num int4,
+    money_unit int4, point int4, special_price int4, sell int4,
+    on_sell_date int4, not_sell_date int4, account_num_limit int4,
+    recognized_percentage float8, fortune_bag text, allow_buy_level int4,
+    new_account_day_limit int4, note text
+) AS $$""" + ITEMMALL_INSERT_FUNCTION_BODY + """$$ LANGUAGE plpgsql;
+"""
+
+
+class ChangeFeedListener:
+    """Escuta o canal de alterações de itemmall numa conexão dedicada e entrega as mudanças em lotes."""
+
+    POLL_TIMEOUT = 1.0
+
+    def __init__(self, pool: "DatabasePool", deliver: Callable[[List[dict]], None]):
+        self.pool = pool
+        self.deliver = deliver
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="db-change-feed", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.POLL_TIMEOUT * 2)
+
+    def _run(self):
+        first = True
+        while not self.stop_event.is_set():
+            conn = None
+            try:
+                conn = self.pool.open_dedicated()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {ITEMMALL_CHANGE_CHANNEL};")
+                if not first:
+                    self.deliver([{"op": "RESYNC"}])
+                first = False
+                self._listen(conn)
+            except Exception as e:
+                if self.stop_event.is_set():
+                    break
+                self.pool.log(
+                    "Feed de alterações desconectado, reconectando: %s",
+                    e,
+                    level="WARNING",
+                    source="DB",
+                )
+                self.stop_event.wait(self.pool.backoff_base)
+            finally:
+                if conn is not None:
+                    DatabasePool._close_quietly(conn)
+
+    def _listen(self, conn):
+        while not self.stop_event.is_set():
+            if not select.select([conn], [], [], self.POLL_TIMEOUT)[0]:
+                continue
+            conn.poll()
+            changes = []
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                change = json.loads(notify.payload)
+                if "key" in change:
+                    change["new"] = self._fetch_row(conn, change.pop("key"))
+                changes.append(change)
+            if changes:
+                METRICS.increment("db.change_feed.notifications", len(changes))
+                self.deliver(changes)
+
+    @staticmethod
+    def _fetch_row(conn, key) -> Optional[dict]:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT {ITEMMALL_COLUMN_LIST} FROM public.itemmall
+                WHERE item_id = %s AND item_group = %s AND item_index = %s
+                  AND money_unit = %s;
+                """,
+                key,
+            )
+            row = cursor.fetchone()
+        return dict(zip(ITEMMALL_COLUMNS, row)) if row else None
+
+
+class ItemStore:
+    """Persistência da tabela itemmall; as linhas seguem a ordem de ITEMMALL_COLUMNS."""
+
+    name = "?"
+    remote = False
+    pool: Optional[DatabasePool] = None
+    errors: tuple = ()
+    log: Callable = FILE_LOGGER.log
+    PLACEHOLDER = "%s"
+    # Limites da chave de paginação (item_index, item_id) nas pontas de uma faixa.
+    MIN_KEY = (-(2**31), -(2**31))
+    MAX_KEY = (2**31 - 1, 2**31 - 1)
+
+    def describe(self) -> str:
+        raise NotImplementedError
+
+    def _read(self, query: str, params: tuple) -> List[tuple]:
+        raise NotImplementedError
+
+    def range_stats(self, group: int, money_unit: int) -> tuple:
+        """(quantidade de itens, maior item_index) da faixa."""
+        mark = self.PLACEHOLDER
+        rows = self._read(
+            "SELECT count(*), coalesce(max(item_index), 0) FROM public.itemmall "
+            f"WHERE item_group = {mark} AND money_unit = {mark};",
+            (group, money_unit),
+        )
+        return tuple(rows[0])
+
+    def fetch_page(
+        self,
+        group: int,
+        money_unit: int,
+        limit: int,
+        after: Optional[tuple] = None,
+        before: Optional[tuple] = None,
+        offset: int = 0,
+    ) -> List[tuple]:
+        """Linhas da faixa na ordem (item_index, item_id), por chave com 'after'/'before' ou por OFFSET."""
+        mark = self.PLACEHOLDER
+        where = f"item_group = {mark} AND money_unit = {mark}"
+        order = "item_index, item_id"
+        params = [group, money_unit]
+        descending = after is None and before is not None
+        if after is not None:
+            where += f" AND (item_index, item_id) > ({mark}, {mark})"
+            params.extend(after)
+        elif descending:
+            where += f" AND (item_index, item_id) < ({mark}, {mark})"
+            order = "item_index DESC, item_id DESC"
+            params.extend(before)
+        query = (
+            f"SELECT {ITEMMALL_COLUMN_LIST} FROM public.itemmall "
+            f"WHERE {where} ORDER BY {order} LIMIT {mark}"
+        )
+        params.append(limit)
+        if after is None and before is None:
+            query += f" OFFSET {mark}"
+            params.append(offset)
+        rows = self._read(query + ";", tuple(params))
+        return rows[::-1] if descending else rows
+
+    @staticmethod
+    def changed_ranges(fingerprint: Dict, known_fingerprint: Optional[Dict]) -> Optional[List[tuple]]:
+        """Faixas (categoria, moeda) que diferem da última carga; None pede carga completa."""
+        if known_fingerprint is None:
+            return None
+        return sorted(
+            key
+            for key in fingerprint.keys() | known_fingerprint.keys()
+            if fingerprint.get(key) != known_fingerprint.get(key)
+        )
+
+    def stream_items(
+        self, known_fingerprint: Optional[Dict], batch_size: int, first_group: Optional[int] = None
+    ):
+        """Gera ("plan", faixas), ("total", n), ("rows", linhas)... e ("done", impressão digital), com 'first_group' primeiro."""
+        raise NotImplementedError
+
+    def fetch_items(self) -> List[tuple]:
+        raise NotImplementedError
+
+    def insert_item(self, row: tuple) -> List[tuple]:
+        """Insere a linha; se o índice já estiver ocupado, usa o próximo livre da faixa."""
+        raise NotImplementedError
+
+    def update_item(self, row: tuple, original_key: tuple) -> List[tuple]:
+        raise NotImplementedError
+
+    def delete_item(self, key: tuple) -> List[tuple]:
+        raise NotImplementedError
+
+    def replace_items(self, items_list: List[ItemMall]):
+        raise NotImplementedError
+
+    def execute_statements(
+        self, statements, batch_rows: int, progress: Optional[Callable[[int], None]] = None
+    ) -> int:
+        """Executa as instruções numa única transação; qualquer erro desfaz tudo."""
+        raise NotImplementedError
+
+    def apply_changes(
+        self, inserts: List[tuple], updates: List[tuple], deletes: List[tuple]
+    ):
+        """Grava inserções, alterações (linha, chave_original) e exclusões numa única transação."""
+        raise NotImplementedError
+
+    def list_indexes(self) -> Dict[str, tuple]:
+        """nome -> (colunas na ordem do índice, único) dos índices válidos de itemmall."""
+        raise NotImplementedError
+
+    def cancel(self) -> int:
+        """Interrompe as instruções em andamento; devolve quantas foram sinalizadas."""
+        return 0
+
+    def create_primary_key(self):
+        raise NotImplementedError
+
+    def create_key_index(self):
+        """Índice comum nas colunas da chave, para quando chaves repetidas impedem a primária."""
+        raise NotImplementedError
+
+    def schema_report(self) -> SchemaReport:
+        indexes = self.list_indexes()
+        coverage = []
+        for label, columns in ITEMMALL_HOT_QUERIES:
+            covering = next(
+                (
+                    name
+                    for name, (index_columns, _) in indexes.items()
+                    if set(index_columns[: len(columns)]) == columns
+                ),
+                None,
+            )
+            coverage.append((label, covering))
+        has_primary_key = any(
+            unique and set(columns) <= set(ITEMMALL_KEY_COLUMNS)
+            for columns, unique in indexes.values()
+        )
+        duplicates = 0
+        if not has_primary_key:
+            key = ", ".join(ITEMMALL_PRIMARY_KEY)
+            duplicates = self._read(
+                f"SELECT count(*) FROM (SELECT 1 FROM public.itemmall GROUP BY {key} "
+                "HAVING count(*) > 1) duplicated;",
+                (),
+            )[0][0]
+        return SchemaReport(coverage, has_primary_key, duplicates)
+
+    def close(self):
+        pass
+
+
+class PostgresItemStore(ItemStore):
+    name = "postgres"
+    remote = True
+    errors = (PgError,)
+
+    def __init__(self, pool: DatabasePool):
+        self.pool = pool
+        self.insert_function_available: Optional[bool] = None
+
+    @property
+    def log(self) -> Callable:
+        return self.pool.log
+
+    @log.setter
+    def log(self, value: Callable):
+        self.pool.log = value
+
+    def describe(self) -> str:
+        params = self.pool.connect_params
+        description = f"PostgreSQL {params.get('host')}:{params.get('port')}/{params.get('dbname')}"
+        replica = self.pool.replica_params
+        if replica:
+            description += f" (leituras na réplica {replica.get('host')}:{replica.get('port')})"
+        return description
+
+    def _execute(
+        self, query: str, params=None, role: str = "write", prepare: bool = True
+    ) -> List[tuple]:
+        def run(conn):
+            with conn.cursor() as cursor:
+                started = time.perf_counter()
+                if prepare:
+                    self.pool.statements.execute(cursor, query, params)
+                else:
+                    cursor.execute(query, params)
+                rows = cursor.fetchall() if cursor.description else []
+                elapsed = time.perf_counter() - started
+            if SLOW_QUERIES.is_slow(elapsed):
+                SLOW_QUERIES.capture(conn, query, params, elapsed)
+            conn.commit()
+            return rows
+
+        return self.pool.run(role, run, retry=role == "read")
+
+    def _read(self, query: str, params: tuple) -> List[tuple]:
+        return self._execute(query, params, role="read")
+
+    def stream_items(
+        self, known_fingerprint: Optional[Dict], batch_size: int, first_group: Optional[int] = None
+    ):
+        query = f"""
+            SELECT {ITEMMALL_COLUMN_LIST}
+            FROM public.itemmall
+            {{where}}
+            ORDER BY item_group = %s DESC, item_group, item_index, money_unit;
+        """
+        with self.pool.connection("read") as conn:
+            with conn.cursor() as probe_cursor:
+                # Sonda e linhas vêm do mesmo snapshot.
+                probe_cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;"
+                )
+                probe_cursor.execute(ITEMMALL_FINGERPRINT_QUERY)
+                fingerprint = {
+                    (group, money_unit): (count, digest)
+                    for group, money_unit, count, digest in probe_cursor.fetchall()
+                }
+            ranges = self.changed_ranges(fingerprint, known_fingerprint)
+            yield "plan", ranges
+            yield "total", sum(
+                count
+                for key, (count, _) in fingerprint.items()
+                if ranges is None or key in ranges
+            )
+            if ranges != []:
+                where, params = "", (first_group,)
+                if ranges:
+                    where = "WHERE (item_group, money_unit) IN %s"
+                    params = (tuple(ranges), first_group)
+                started = time.perf_counter()
+                with conn.cursor(name="itemmall_stream") as cursor:
+                    cursor.itersize = batch_size
+                    cursor.execute(query.format(where=where), params)
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield "rows", rows
+                elapsed = time.perf_counter() - started
+                if SLOW_QUERIES.is_slow(elapsed):
+                    SLOW_QUERIES.capture(conn, query.format(where=where), params, elapsed)
+        yield "done", fingerprint
+
+    def fetch_items(self) -> List[tuple]:
+        return self._execute(f"SELECT {ITEMMALL_COLUMN_LIST} FROM public.itemmall;", role="read")
+
+    def _ensure_insert_function(self) -> bool:
+        if self.insert_function_available is None:
+            try:
+                with self.pool.connection("write") as conn:
+                    with conn.cursor() as cursor:
+                        # Recria também uma versão antiga, com outro corpo, da função.
+                        cursor.execute(
+                            "SELECT prosrc FROM pg_proc WHERE oid = to_regprocedure("
+                            "'public.itemmall_insert_item("
+                            "int4, int4, int4, int4, int4, int4, int4, int4, int4, int4, "
+                            "int4, float8, text, int4, int4, text)');"
+                        )
+                        installed = cursor.fetchone()
+                        if installed is None or installed[0] != ITEMMALL_INSERT_FUNCTION_BODY:
+                            cursor.execute(ITEMMALL_INSERT_FUNCTION_SQL)
+                    conn.commit()
+                self.insert_function_available = True
+            except PgError as e:
+                self.insert_function_available = False
+                self.log(
+                    "Função itemmall_insert_item indisponível, usando INSERT com lock consultivo: %s",
+                    e,
+                    level="WARNING",
+                    source="DB",
+                )
+        return self.insert_function_available
+
+    def insert_item(self, row: tuple) -> List[tuple]:
+        placeholders = ", ".join(["%s"] * len(ITEMMALL_COLUMNS))
+        if self._ensure_insert_function():
+            query = f"""
+                SELECT {ITEMMALL_COLUMN_LIST}
+                FROM public.itemmall_insert_item({placeholders});
+            """
+            return self._execute(query, row)
+
+        # Duas instruções no mesmo envio: o INSERT enxerga o que foi gravado antes do lock.
+        query = f"""
+            SELECT pg_advisory_xact_lock(
+                hashtext('public.itemmall'), hashtext(%s || ':' || %s)
+            );
+            INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST})
+            SELECT %s, %s,
+                CASE WHEN EXISTS (
+                    SELECT 1 FROM public.itemmall
+                    WHERE item_group = %s AND item_index = %s AND money_unit = %s
+                ) THEN (
+                    SELECT coalesce(max(item_index), 0) + 1 FROM public.itemmall
+                    WHERE item_group = %s AND money_unit = %s
+                ) ELSE %s END,
+                {", ".join(["%s"] * (len(ITEMMALL_COLUMNS) - 3))}
+            RETURNING {ITEMMALL_COLUMN_LIST};
+        """
+        item_id, group, requested_index, money_unit = row[0], row[1], row[2], row[4]
+        params = (
+            (group, money_unit, item_id, group)
+            + (group, requested_index, money_unit, group, money_unit, requested_index)
+            + row[3:]
+        )
+        return self._execute(query, params, prepare=False)
+
+    def update_item(self, row: tuple, original_key: tuple) -> List[tuple]:
+        assignments = ",\n                ".join(f"{c} = %s" for c in ITEMMALL_COLUMNS)
+        query = f"""
+            UPDATE public.itemmall SET
+                {assignments}
+            WHERE item_id = %s AND item_group = %s AND item_index = %s AND money_unit = %s
+            RETURNING {ITEMMALL_COLUMN_LIST};
+        """
+        return self._execute(query, tuple(row) + tuple(original_key))
+
+    def delete_item(self, key: tuple) -> List[tuple]:
+        query = f"""
+            DELETE FROM public.itemmall
+            WHERE item_id = %s AND item_group = %s AND item_index = %s AND money_unit = %s
+            RETURNING {ITEMMALL_COLUMN_LIST};
+        """
+        return self._execute(query, key)
+
+    def replace_items(self, items_list: List[ItemMall]):
+        buffer = items_copy_buffer(items_list)
+        with self.pool.connection("bulk") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("TRUNCATE public.itemmall;")
+                cursor.copy_expert(
+                    f"COPY public.itemmall ({ITEMMALL_COLUMN_LIST}) FROM STDIN", buffer
+                )
+            conn.commit()
+
+    def execute_statements(
+        self, statements, batch_rows: int, progress: Optional[Callable[[int], None]] = None
+    ) -> int:
+        executed = 0
+        last_report = time.perf_counter()
+        with self.pool.connection("bulk") as conn:
+            with conn.cursor() as cursor:
+                for sql, count in batch_insert_statements(statements, batch_rows):
+                    try:
+                        cursor.execute(sql)
+                    except PgError as statement_error:
+                        self.log(
+                            f"Erro ao executar comando do arquivo SQL: {statement_error}\nComando: {sql[:200]}...",
+                            level="ERROR",
+                            source="DB",
+                        )
+                        raise
+                    executed += count
+                    if progress and time.perf_counter() - last_report >= 0.1:
+                        last_report = time.perf_counter()
+                        progress(executed)
+            conn.commit()
+        return executed
+
+    def apply_changes(
+        self, inserts: List[tuple], updates: List[tuple], deletes: List[tuple]
+    ):
+        key_match = " AND ".join(f"t.{c} = v.o_{c}" for c in ITEMMALL_KEY_COLUMNS)
+        original_keys = ", ".join(f"o_{c}" for c in ITEMMALL_KEY_COLUMNS)
+        assignments = ", ".join(f"{c} = v.{c}" for c in ITEMMALL_COLUMNS)
+
+        def run(conn):
+            with conn.cursor() as cursor:
+                if deletes:
+                    rows = execute_values(
+                        cursor,
+                        f"DELETE FROM public.itemmall t USING (VALUES %s) AS v({original_keys}) "
+                        f"WHERE {key_match} RETURNING 1;",
+                        deletes,
+                        fetch=True,
+                    )
+                    if len(rows) < len(deletes):
+                        raise ValueError(
+                            f"{len(deletes) - len(rows)} itens a excluir não existem mais no DB"
+                        )
+                if updates:
+                    rows = execute_values(
+                        cursor,
+                        f"UPDATE public.itemmall t SET {assignments} "
+                        f"FROM (VALUES %s) AS v({ITEMMALL_COLUMN_LIST}, {original_keys}) "
+                        f"WHERE {key_match} RETURNING 1;",
+                        [tuple(row) + tuple(key) for row, key in updates],
+                        fetch=True,
+                    )
+                    if len(rows) < len(updates):
+                        raise ValueError(
+                            f"{len(updates) - len(rows)} itens alterados não existem mais no DB"
+                        )
+                if inserts:
+                    execute_values(
+                        cursor,
+                        f"INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST}) VALUES %s;",
+                        inserts,
+                    )
+            conn.commit()
+
+        self.pool.run("write", run)
+
+    def list_indexes(self) -> Dict[str, tuple]:
+        rows = self._read(
+            """
+            SELECT c.relname, i.indisunique,
+                array(
+                    SELECT a.attname
+                    FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                    ORDER BY k.position
+                )
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'public.itemmall'::regclass
+                AND i.indisvalid AND i.indpred IS NULL;
+            """,
+            (),
+        )
+        return {name: (tuple(columns), unique) for name, unique, columns in rows}
+
+    def cancel(self) -> int:
+        return self.pool.cancel_active()
+
+    def create_primary_key(self):
+        """Cria a chave primária sem bloquear leituras e escritas durante a indexação."""
+        self._create_index_concurrently(
+            "itemmall_pkey",
+            unique=True,
+            then="ALTER TABLE public.itemmall "
+            "ADD CONSTRAINT itemmall_pkey PRIMARY KEY USING INDEX itemmall_pkey;",
+        )
+
+    def create_key_index(self):
+        self._create_index_concurrently("itemmall_key_idx", unique=False)
+
+    def _create_index_concurrently(self, name: str, unique: bool, then: Optional[str] = None):
+        columns = ", ".join(ITEMMALL_PRIMARY_KEY)
+        drop = f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};"
+        with self.pool.connection("bulk") as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    # Remove o índice inválido deixado por uma tentativa interrompida.
+                    cursor.execute(drop)
+                    try:
+                        cursor.execute(
+                            f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {name} "
+                            f"ON public.itemmall ({columns});"
+                        )
+                        if then:
+                            cursor.execute(then)
+                    except PgError:
+                        # Um CREATE INDEX CONCURRENTLY que falha deixa o índice INVALID na tabela.
+                        if not conn.closed:
+                            try:
+                                with conn.cursor() as cleanup:
+                                    cleanup.execute(drop)
+                            except PgError:
+                                pass
+                        raise
+                    cursor.execute("ANALYZE public.itemmall;")
+            finally:
+                if not conn.closed:
+                    conn.autocommit = False
+
+    def close(self):
+        self.pool.close_all()
+
+
+class SqliteItemStore(ItemStore):
+    """A mesma tabela itemmall num arquivo SQLite anexado como 'public', ou só em memória."""
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+    PLACEHOLDER = "?"
+    MEMORY = ":memory:"
+
+    DDL = """
+        CREATE TABLE IF NOT EXISTS public.itemmall (
+            item_id INTEGER NOT NULL,
+            item_group INTEGER NOT NULL,
+            item_index INTEGER NOT NULL,
+            item_num INTEGER NOT NULL,
+            money_unit INTEGER NOT NULL,
+            point INTEGER NOT NULL,
+            special_price INTEGER NOT NULL,
+            sell INTEGER NOT NULL,
+            on_sell_date INTEGER NOT NULL,
+            not_sell_date INTEGER NOT NULL,
+            account_num_limit INTEGER DEFAULT 0,
+            recognized_percentage REAL NOT NULL,
+            fortune_bag TEXT DEFAULT '',
+            allow_buy_level INTEGER NOT NULL,
+            new_account_day_limit INTEGER DEFAULT 0,
+            note TEXT DEFAULT ''
+        );
+    """
+    _KEY_FILTER = "item_id = ? AND item_group = ? AND item_index = ? AND money_unit = ?"
+    _PLACEHOLDERS = ", ".join(["?"] * len(ITEMMALL_COLUMNS))
+
+    def __init__(self, path: str = MEMORY):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("ATTACH DATABASE ? AS public;", (path,))
+        self.conn.create_function(
+            "row_digest", len(ITEMMALL_COLUMNS), self._row_digest, deterministic=True
+        )
+        with self.conn:
+            self.conn.execute(self.DDL)
+
+    @staticmethod
+    def _row_digest(*row) -> int:
+        return zlib.crc32(repr(row).encode("utf-8"))
+
+    def describe(self) -> str:
+        return "SQLite (memória)" if self.path == self.MEMORY else f"SQLite {self.path}"
+
+    def _read(self, query: str, params: tuple) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def stream_items(
+        self, known_fingerprint: Optional[Dict], batch_size: int, first_group: Optional[int] = None
+    ):
+        with self.lock:
+            fingerprint = {
+                (group, money_unit): (count, digest)
+                for group, money_unit, count, digest in self.conn.execute(
+                    f"SELECT item_group, money_unit, count(*), sum(row_digest({ITEMMALL_COLUMN_LIST})) "
+                    "FROM public.itemmall GROUP BY item_group, money_unit;"
+                )
+            }
+            ranges = self.changed_ranges(fingerprint, known_fingerprint)
+            rows = []
+            if ranges != []:
+                wanted = set(ranges or ())
+                rows = [
+                    row
+                    for row in self.conn.execute(
+                        f"SELECT {ITEMMALL_COLUMN_LIST} FROM public.itemmall "
+                        "ORDER BY item_group = ? DESC, item_group, item_index, money_unit;",
+                        (first_group,),
+                    )
+                    if not wanted or (row[1], row[4]) in wanted
+                ]
+        yield "plan", ranges
+        yield "total", len(rows)
+        for start in range(0, len(rows), batch_size):
+            yield "rows", rows[start : start + batch_size]
+        yield "done", fingerprint
+
+    def fetch_items(self) -> List[tuple]:
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT {ITEMMALL_COLUMN_LIST} FROM public.itemmall;"
+            ).fetchall()
+
+    def insert_item(self, row: tuple) -> List[tuple]:
+        row = tuple(row)
+        with self.lock, self.conn:
+            group, index, money_unit = row[1], row[2], row[4]
+            taken = self.conn.execute(
+                "SELECT 1 FROM public.itemmall "
+                "WHERE item_group = ? AND item_index = ? AND money_unit = ?;",
+                (group, index, money_unit),
+            ).fetchone()
+            if taken:
+                (index,) = self.conn.execute(
+                    "SELECT coalesce(max(item_index), 0) + 1 FROM public.itemmall "
+                    "WHERE item_group = ? AND money_unit = ?;",
+                    (group, money_unit),
+                ).fetchone()
+                row = row[:2] + (index,) + row[3:]
+            self.conn.execute(
+                f"INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST}) VALUES ({self._PLACEHOLDERS});",
+                row,
+            )
+        return [row]
+
+    def update_item(self, row: tuple, original_key: tuple) -> List[tuple]:
+        assignments = ", ".join(f"{c} = ?" for c in ITEMMALL_COLUMNS)
+        with self.lock, self.conn:
+            updated = self.conn.execute(
+                f"UPDATE public.itemmall SET {assignments} WHERE {self._KEY_FILTER};",
+                tuple(row) + tuple(original_key),
+            ).rowcount
+        return [tuple(row)] * updated
+
+    def delete_item(self, key: tuple) -> List[tuple]:
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                f"SELECT {ITEMMALL_COLUMN_LIST} FROM public.itemmall WHERE {self._KEY_FILTER};",
+                tuple(key),
+            ).fetchall()
+            self.conn.execute(
+                f"DELETE FROM public.itemmall WHERE {self._KEY_FILTER};", tuple(key)
+            )
+        return rows
+
+    def replace_items(self, items_list: List[ItemMall]):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM public.itemmall;")
+            self.conn.executemany(
+                f"INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST}) VALUES ({self._PLACEHOLDERS});",
+                (item.values() for item in items_list),
+            )
+
+    def _script_statements(self, statements, skipped: List[int]):
+        """Mantém só o que o SQLite entende de um script de itemmall: DROP vira DELETE e CREATE é ignorado."""
+        for statement in statements:
+            target = _INSERT_TARGET.match(statement)
+            if target and re.fullmatch(_ITEMMALL_TABLE, target.group("table").strip()):
+                yield statement
+            elif _ITEMMALL_DDL.match(statement):
+                if statement[:4].upper() == "DROP":
+                    yield "DELETE FROM public.itemmall"
+            else:
+                skipped[0] += 1
+
+    def execute_statements(
+        self, statements, batch_rows: int, progress: Optional[Callable[[int], None]] = None
+    ) -> int:
+        executed = 0
+        skipped = [0]
+        last_report = time.perf_counter()
+        with self.lock, self.conn:
+            for sql, count in batch_insert_statements(
+                self._script_statements(statements, skipped), batch_rows
+            ):
+                try:
+                    self.conn.execute(sql)
+                except sqlite3.Error as statement_error:
+                    self.log(
+                        f"Erro ao executar comando do arquivo SQL: {statement_error}\nComando: {sql[:200]}...",
+                        level="ERROR",
+                        source="DB",
+                    )
+                    raise
+                executed += count
+                if progress and time.perf_counter() - last_report >= 0.1:
+                    last_report = time.perf_counter()
+                    progress(executed)
+        if skipped[0]:
+            self.log(
+                "%d instruções que não são de itemmall foram ignoradas no SQLite.",
+                skipped[0],
+                level="WARNING",
+                source="DB",
+            )
+        return executed
+
+    def apply_changes(
+        self, inserts: List[tuple], updates: List[tuple], deletes: List[tuple]
+    ):
+        assignments = ", ".join(f"{c} = ?" for c in ITEMMALL_COLUMNS)
+        with self.lock, self.conn:
+            missing = sum(
+                self.conn.execute(
+                    f"DELETE FROM public.itemmall WHERE {self._KEY_FILTER};", tuple(key)
+                ).rowcount
+                == 0
+                for key in deletes
+            )
+            if missing:
+                raise ValueError(f"{missing} itens a excluir não existem mais no DB")
+            missing = sum(
+                self.conn.execute(
+                    f"UPDATE public.itemmall SET {assignments} WHERE {self._KEY_FILTER};",
+                    tuple(row) + tuple(key),
+                ).rowcount
+                == 0
+                for row, key in updates
+            )
+            if missing:
+                raise ValueError(f"{missing} itens alterados não existem mais no DB")
+            self.conn.executemany(
+                f"INSERT INTO public.itemmall ({ITEMMALL_COLUMN_LIST}) VALUES ({self._PLACEHOLDERS});",
+                inserts,
+            )
+
+    def list_indexes(self) -> Dict[str, tuple]:
+        indexes = {}
+        with self.lock:
+            for _, name, unique, *_ in self.conn.execute(
+                "PRAGMA public.index_list('itemmall');"
+            ).fetchall():
+                info = self.conn.execute(f"PRAGMA public.index_info('{name}');").fetchall()
+                indexes[name] = (tuple(column for _, _, column in info), bool(unique))
+        return indexes
+
+    def cancel(self) -> int:
+        self.conn.interrupt()
+        return 1
+
+    def create_primary_key(self):
+        # Uma tabela SQLite já criada não ganha PRIMARY KEY; um índice único equivale.
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS public.itemmall_pkey "
+                f"ON itemmall ({', '.join(ITEMMALL_PRIMARY_KEY)});"
+            )
+
+    def create_key_index(self):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS public.itemmall_key_idx "
+                f"ON itemmall ({', '.join(ITEMMALL_PRIMARY_KEY)});"
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class UiDispatcher:
+    """Fila pela qual outras threads pedem que callbacks rodem na thread do Tk."""
+
+    def __init__(self, root, poll_ms: int = 15, tick_budget: float = 0.012):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.tick_budget = tick_budget
+        self.queue = queue.Queue()
+        self.log: Callable = FILE_LOGGER.log
+
+    def post(self, callback: Callable, *args):
+        self.queue.put((callback, args, time.perf_counter(), TRACER.context()))
+
+    def start(self):
+        self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        # Agenda antes de drenar: um callback modal (wait_window) não para a fila.
+        self.root.after(self.poll_ms, self._poll)
+        self.drain()
+
+    def drain(self, budget: Optional[float] = None) -> int:
+        deadline = time.perf_counter() + (self.tick_budget if budget is None else budget)
+        handled = 0
+        while time.perf_counter() < deadline:
+            try:
+                callback, args, posted_at, cause = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            METRICS.observe("ui.dispatch.lag", time.perf_counter() - posted_at)
+            handled += 1
+            try:
+                if cause is None:
+                    callback(*args)
+                else:
+                    name = getattr(callback, "__qualname__", str(callback))
+                    with TRACER.span("ui.callback", {"callback": name}, cause=cause):
+                        callback(*args)
+            except Exception as e:
+                self.log(
+                    "Erro ao processar resultado na interface: %s",
+                    e,
+                    level="ERROR",
+                    source="UI",
+                )
+        return handled
+
+
+class DbExecutor:
+    """Executa as operações de banco numa thread por faixa; tudo o que altera itemmall usa a faixa "write"."""
+
+    def __init__(self, dispatcher: UiDispatcher):
+        self.dispatcher = dispatcher
+        self.lanes: Dict[str, queue.Queue] = {}
+        self.threads: List[threading.Thread] = []
+        self.in_flight: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def submit(
+        self,
+        lane: str,
+        func: Callable,
+        *args,
+        on_done: Optional[Callable[[Future], None]] = None,
+    ) -> Future:
+        future = Future()
+        with self.lock:
+            tasks = self.lanes.get(lane)
+            if tasks is None:
+                tasks = self.lanes[lane] = queue.Queue()
+                thread = threading.Thread(
+                    target=self._worker, args=(lane, tasks), name=f"db-{lane}", daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+            self.in_flight[lane] = self.in_flight.get(lane, 0) + 1
+            METRICS.set_gauge("db.executor.in_flight", self.in_flight[lane], {"lane": lane})
+        future.add_done_callback(lambda _: self._settle(lane))
+        if on_done:
+            future.add_done_callback(lambda done: self.dispatcher.post(on_done, done))
+        tasks.put((future, func, args, time.perf_counter(), TRACER.context()))
+        return future
+
+    def busy(self, lane: Optional[str] = None) -> bool:
+        """Se a faixa (ou, sem 'lane', qualquer faixa) tem operações enviadas e não concluídas."""
+        with self.lock:
+            if lane is None:
+                return any(self.in_flight.values())
+            return self.in_flight.get(lane, 0) > 0
+
+    def _settle(self, lane: str):
+        with self.lock:
+            self.in_flight[lane] -= 1
+            METRICS.set_gauge("db.executor.in_flight", self.in_flight[lane], {"lane": lane})
+
+    def _worker(self, lane: str, tasks: queue.Queue):
+        while True:
+            entry = tasks.get()
+            if entry is None:
+                return
+            future, func, args, queued_at, cause = entry
+            METRICS.observe("db.executor.wait", time.perf_counter() - queued_at, {"lane": lane})
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Liga o trabalho ao span de quem o enviou, que ficou na thread do Tk.
+            task = {"task": getattr(func, "__qualname__", str(func))}
+            with TRACER.span(f"executor.{lane}", task, cause=cause) if cause else nullcontext():
+                try:
+                    future.set_result(func(*args))
+                except Exception as e:
+                    future.set_exception(e)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Deixa as faixas terminarem o que já foi enviado, esperando até 'timeout' segundos."""
+        with self.lock:
+            lanes = list(self.lanes.values())
+            threads = list(self.threads)
+        for tasks in lanes:
+            tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+
 class LoginScreen:
-    def __init__(self, master):
+    def __init__(self, master, storage: str = "postgres"):
         self.master = master
         self.master.title("Loja - Login no Banco de Dados")
-        self.master.geometry("450x450")
+        self.master.geometry("450x560")
         self.master.configure(bg="#2C3E50")
         self.master.resizable(False, False)
 
         self.master.update_idletasks()
         x = (self.master.winfo_screenwidth() // 2) - (450 // 2)
-        y = (self.master.winfo_screenheight() // 2) - (450 // 2)
-        self.master.geometry(f"450x450+{x}+{y}")
+        y = (self.master.winfo_screenheight() // 2) - (560 // 2)
+        self.master.geometry(f"450x560+{x}+{y}")
 
         self.style = ttk.Style()
         self.style.theme_use("clam")
@@ -300,15 +3375,20 @@ class LoginScreen:
 
         self.check_and_set_game_directory()
         self.create_widgets()
+        if storage == "sqlite" and self.game_directory:
+            self.master.after(0, self.open_offline)
 
-    def save_login_info(self, host, port, user, password):
+    def save_login_info(self, host, port, user, password, replica=""):
         try:
-            env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
-            with open(env_path, "w", encoding="utf-8") as f:
-                f.write(f"DB_HOST={host}\n")
-                f.write(f"DB_PORT={port}\n")
-                f.write(f"DB_USER={user}\n")
-                f.write(f"DB_PASSWORD={password}\n")
+            APP_SETTINGS.update(
+                {
+                    "DB_HOST": host,
+                    "DB_PORT": port,
+                    "DB_USER": user,
+                    "DB_PASSWORD": password,
+                    "DB_REPLICA": replica,
+                }
+            )
             self.log_console.log_message(
                 "Informações de login salvas no arquivo .env", level="INFO", source="UI"
             )
@@ -319,7 +3399,7 @@ class LoginScreen:
 
     def load_login_info(self):
         try:
-            env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+            env_path = APP_SETTINGS.env_path
             if not os.path.exists(env_path):
                 with open(env_path, "w", encoding="utf-8") as f:
                     f.write("DB_HOST=localhost\n")
@@ -352,7 +3432,6 @@ class LoginScreen:
         return {}
 
     def check_and_set_game_directory(self):
-        start_time = time.time()
         saved_path = self.registry_manager.read_path()
 
         if saved_path and DirectoryValidator.is_valid_game_directory(saved_path):
@@ -383,15 +3462,8 @@ class LoginScreen:
                 "Um diretório válido do jogo Grand Fantasia é necessário para continuar. O aplicativo será fechado.",
             )
             self.master.destroy()
-        end_time = time.time()
-        self.log_console.log_message(
-            f"Tempo de execução check_and_set_game_directory: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="UI",
-        )
 
     def prompt_for_game_directory(self):
-        start_time = time.time()
         while True:
             selected_directory = filedialog.askdirectory(
                 title="Selecione a pasta do Grand Fantasia (onde está GrandFantasia.exe)"
@@ -430,12 +3502,6 @@ class LoginScreen:
                     level="ERROR",
                     source="UI",
                 )
-        end_time = time.time()
-        self.log_console.log_message(
-            f"Tempo de execução prompt_for_game_directory: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="UI",
-        )
 
     def create_widgets(self):
         login_frame = ttk.Frame(
@@ -463,6 +3529,7 @@ class LoginScreen:
             ("Porta:", "port_entry", saved_login.get("DB_PORT", "5432")),
             ("Usuário:", "user_entry", saved_login.get("DB_USER", "postgres")),
             ("Senha:", "password_entry", saved_login.get("DB_PASSWORD", "")),
+            ("Réplica:", "replica_entry", saved_login.get("DB_REPLICA", "")),
         ]
 
         self.entries = {}
@@ -480,12 +3547,22 @@ class LoginScreen:
 
             if field_name == "password_entry":
                 entry.config(show="*")
+            elif field_name == "replica_entry":
+                Tooltip(entry, "Opcional: host[:porta] de uma réplica para as leituras")
 
         connect_button = ttk.Button(
             self.master, text="Conectar", command=self.connect_to_db, style="TButton"
         )
         connect_button.pack(pady=(0, 10))
 
+        offline_button = ttk.Button(
+            self.master,
+            text="Modo Offline (SQLite)",
+            command=self.open_offline,
+            style="TButton",
+        )
+        offline_button.pack(pady=(0, 5))
+
         change_dir_button = ttk.Button(
             self.master,
             text="Trocar Diretório do Jogo",
@@ -495,7 +3572,6 @@ class LoginScreen:
         change_dir_button.pack(pady=(5, 20))
 
     def connect_to_db(self):
-        start_time = time.time()
         if not self.game_directory:
             self.log_console.log_message(
                 "Diretório do jogo não definido. Não é possível conectar ao DB.",
@@ -515,26 +3591,57 @@ class LoginScreen:
         port = self.entries["port_entry"].get()
         user = self.entries["user_entry"].get()
         password = self.entries["password_entry"].get()
+        replica = self.entries["replica_entry"].get().strip()
         db_name = "gf_ls"
 
-        self.save_login_info(host, port, user, password)
-
+        self.save_login_info(host, port, user, password, replica)
+
+        connect_params = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": password,
+            "dbname": db_name,
+            "client_encoding": "UTF8",
+            "connect_timeout": 5,
+        }
+        replica_params = None
+        if replica:
+            replica_host, _, replica_port = replica.partition(":")
+            replica_params = dict(
+                connect_params, host=replica_host, port=replica_port or port
+            )
         conn = None
         try:
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                dbname=db_name,
-                client_encoding="UTF8",
-                connect_timeout=5,
-            )
+            with METRICS.timer("connect_to_db"):
+                conn = psycopg2.connect(**connect_params)
             self.log_console.log_message(
                 "Conexão ao banco de dados estabelecida!", level="INFO", source="DB"
             )
+            db_pool = DatabasePool(
+                connect_params,
+                validate_after=APP_SETTINGS.get_float("DB_POOL_VALIDATE_AFTER", 5.0),
+                max_attempts=APP_SETTINGS.get_int("DB_POOL_MAX_ATTEMPTS", 4),
+                prepare_statements=APP_SETTINGS.get_bool("DB_PREPARED_STATEMENTS", True),
+                replica_params=replica_params,
+                replica_max_wait=APP_SETTINGS.get_int("REPLICA_MAX_WAIT_MS", 2000) / 1000,
+                replica_retry_after=APP_SETTINGS.get_float("REPLICA_RETRY_S", 30.0),
+                timeouts={
+                    role: (
+                        APP_SETTINGS.get_int(
+                            f"DB_STATEMENT_TIMEOUT_{role.upper()}_MS", statement
+                        ),
+                        APP_SETTINGS.get_int(f"DB_LOCK_TIMEOUT_{role.upper()}_MS", lock),
+                    )
+                    for role, (statement, lock) in DatabasePool.DEFAULT_TIMEOUTS.items()
+                },
+                retry_attempts=APP_SETTINGS.get_int("DB_RETRY_ATTEMPTS", 3),
+            )
+            db_pool.adopt(conn, "write")
             self.master.destroy()
-            app = ItemMallEditor(db_connection=conn, game_directory=self.game_directory)
+            app = ItemMallEditor(
+                store=PostgresItemStore(db_pool), game_directory=self.game_directory
+            )
             app.run()
         except psycopg2.OperationalError as e:
             error_msg = str(e).lower()
@@ -594,25 +3701,230 @@ class LoginScreen:
             self.log_console.log_message(
                 f"Erro inesperado ao conectar ao DB: {e}", level="ERROR", source="DB"
             )
-            if conn:
-                conn.close()
-        finally:
-            end_time = time.time()
-            self.log_console.log_message(
-                f"Tempo de execução connect_to_db: {end_time - start_time:.4f} segundos",
-                level="INFO",
-                source="UI",
+            if conn:
+                conn.close()
+
+    def open_offline(self):
+        """Abre o editor sobre um itemmall local em SQLite, sem conectar ao PostgreSQL."""
+        if not self.game_directory:
+            return
+        path = APP_SETTINGS.get("OFFLINE_DB_PATH") or os.path.join(
+            APP_DIR, "offline.sqlite3"
+        )
+        try:
+            store = SqliteItemStore(path)
+        except sqlite3.Error as e:
+            messagebox.showerror(
+                "Erro no Modo Offline", f"Não foi possível abrir o banco local: {e}"
+            )
+            self.log_console.log_message(
+                f"Erro ao abrir o banco offline '{path}': {e}", level="ERROR", source="DB"
+            )
+            return
+        self.master.destroy()
+        app = ItemMallEditor(store=store, game_directory=self.game_directory)
+        app.run()
+
+
+class MemoryWindow:
+    def __init__(self, master, governor: MemoryGovernor, refresh_ms: int = 1000):
+        self.master = master
+        self.governor = governor
+        self.refresh_ms = refresh_ms
+        self.window = None
+        self.tree = None
+        self.total_label = None
+        self.after_id = None
+
+    def show(self):
+        if self.window and self.window.winfo_exists():
+            self.window.lift()
+            return
+
+        self.window = tk.Toplevel(self.master)
+        self.window.title("Memória")
+        self.window.geometry("560x340")
+        self.window.configure(bg="#2C3E50")
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        frame = tk.Frame(self.window, bg="#34495E", relief="solid", bd=1)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        self.total_label = tk.Label(
+            frame,
+            text="",
+            font=("Tahoma", 10, "bold"),
+            bg="#34495E",
+            fg="#BDC3C7",
+        )
+        self.total_label.pack(anchor="w", padx=5, pady=(5, 0))
+
+        self.tree = ttk.Treeview(
+            frame, columns=("size", "priority", "evictable"), height=8
+        )
+        self.tree.heading("#0", text="Cache")
+        self.tree.column("#0", width=200)
+        self.tree.heading("size", text="Tamanho (KiB)")
+        self.tree.column("size", width=110, anchor="e")
+        self.tree.heading("priority", text="Prioridade")
+        self.tree.column("priority", width=80, anchor="e")
+        self.tree.heading("evictable", text="Despejável")
+        self.tree.column("evictable", width=90, anchor="center")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        ttk.Button(frame, text="Aplicar Limite Agora", command=self._enforce).pack(
+            pady=5
+        )
+
+        self._refresh()
+
+    def hide(self):
+        if self.after_id:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        if self.window:
+            self.window.destroy()
+            self.window = None
+
+    def _enforce(self):
+        self.governor.enforce()
+        self._refresh()
+
+    def _refresh(self):
+        if self.after_id:
+            self.master.after_cancel(self.after_id)
+        self.after_id = None
+        if not self.window or not self.window.winfo_exists():
+            return
+        rows = self.governor.usage()
+        total = sum(row[1] for row in rows)
+        self.total_label.config(
+            text=f"Total estimado: {total / 1048576:.1f} MiB de "
+            f"{self.governor.budget_bytes / 1048576:.0f} MiB "
+            f"(despejado até agora: {self.governor.evicted_bytes / 1048576:.1f} MiB)"
+        )
+        self.tree.delete(*self.tree.get_children())
+        for name, size, priority, evictable in sorted(rows, key=lambda row: -row[1]):
+            self.tree.insert(
+                "",
+                tk.END,
+                text=name,
+                values=(f"{size / 1024:.1f}", priority, "Sim" if evictable else "Não"),
+            )
+        self.after_id = self.master.after(self.refresh_ms, self._refresh)
+
+
+class SyncPreviewDialog:
+    ACTION_LABELS = {"INSERT": "Inserir", "UPDATE": "Alterar", "DELETE": "Remover"}
+
+    def __init__(self, parent, changes: ItemChangeSet, source_name: str):
+        self.confirmed = False
+
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("Prévia da Sincronização")
+        self.dialog.geometry("760x460")
+        self.dialog.configure(bg="#2C3E50")
+        self.dialog.transient(parent)
+        self.dialog.grab_set()
+
+        frame = tk.Frame(self.dialog, bg="#34495E", relief="solid", bd=1)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        tk.Label(
+            frame,
+            text=f"Origem: {source_name} — {changes.insert_count} a inserir, "
+            f"{changes.update_count} a alterar, {changes.delete_count} a remover",
+            font=("Tahoma", 10, "bold"),
+            bg="#34495E",
+            fg="#BDC3C7",
+        ).pack(anchor="w", padx=5, pady=(5, 0))
+
+        tree = ttk.Treeview(
+            frame,
+            columns=("item_id", "item_group", "item_index", "money_unit", "changes"),
+            height=14,
+        )
+        tree.heading("#0", text="Ação")
+        tree.column("#0", width=80)
+        for column, title, width in (
+            ("item_id", "ID", 70),
+            ("item_group", "Grupo", 60),
+            ("item_index", "Índice", 60),
+            ("money_unit", "Moeda", 60),
+            ("changes", "Alterações", 380),
+        ):
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor="w" if column == "changes" else "e")
+        for action, row, changed in changes.samples:
+            values = dict(zip(ITEMMALL_COLUMNS, row))
+            tree.insert(
+                "",
+                tk.END,
+                text=self.ACTION_LABELS[action],
+                values=(
+                    values["item_id"],
+                    values["item_group"],
+                    values["item_index"],
+                    values["money_unit"],
+                    ", ".join(f"{c}: {old} → {new}" for c, old, new in changed),
+                ),
             )
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        shown = len(changes.samples)
+        total = changes.insert_count + changes.update_count + changes.delete_count
+        if shown < total:
+            tk.Label(
+                frame,
+                text=f"Mostrando {shown} de {total} alterações.",
+                font=("Tahoma", 9),
+                bg="#34495E",
+                fg="#BDC3C7",
+            ).pack(anchor="w", padx=5)
+
+        buttons = tk.Frame(frame, bg="#34495E")
+        buttons.pack(pady=5)
+        ttk.Button(buttons, text="Aplicar", command=self.confirm).pack(
+            side=tk.LEFT, padx=5
+        )
+        ttk.Button(buttons, text="Cancelar", command=self.dialog.destroy).pack(
+            side=tk.LEFT, padx=5
+        )
+
+        self.dialog.wait_window()
+
+    def confirm(self):
+        self.confirmed = True
+        self.dialog.destroy()
 
 
 class ItemMallEditor:
-    def __init__(self, db_connection=None, game_directory=None):
+    DISPATCH_POLL_MS = 15
+    DISPATCH_TICK_BUDGET = 0.012
+    CANCEL_CHECK_MS = 250
+    CHANGE_POLL_MS = 100
+    CHANGE_RELOAD_THRESHOLD = 2000
+    ICON_ESTIMATED_BYTES = 8 * 1024
+    LOG_ENTRY_ESTIMATED_BYTES = 256
+    TRACE_SPAN_ESTIMATED_BYTES = 320
+
+    def __init__(self, store: Optional[ItemStore] = None, game_directory=None):
         self.root = tk.Tk()
         self.root.title("Loja")
         self.root.geometry("1200x800")
         self.root.configure(bg="#2C3E50")
 
-        self.db_conn = db_connection
+        self.dispatcher = UiDispatcher(
+            self.root, self.DISPATCH_POLL_MS, self.DISPATCH_TICK_BUDGET
+        )
+        self.dispatcher.log = self.log_message
+        self.executor = DbExecutor(self.dispatcher)
+
+        self.store = store
+        # Sincronização, atualizações ao vivo e snapshot exigem PostgreSQL.
+        self.db_pool = store.pool if store else None
+        if self.store:
+            self.store.log = self.log_from_thread
         self.game_directory = game_directory
         
         self.current_lang_folder = "Translate_PT"
@@ -636,32 +3948,224 @@ class ItemMallEditor:
         ]
 
         self.items: List[ItemMall] = []
+        self.items_by_key: Dict[tuple, ItemMall] = {}
         self.filtered_items: List[ItemMall] = []
-        self.item_icons = {}
+        self.load_batch_size = max(1, APP_SETTINGS.get_int("LOAD_BATCH_SIZE", 500))
+        self.sql_insert_batch_rows = max(
+            1, APP_SETTINGS.get_int("SQL_INSERT_BATCH_ROWS", 500)
+        )
+        self.load_generation = 0
+        self.loading_items: Optional[List[ItemMall]] = None
+        self.loading_swapped = False
+        self.loading_total = 0
+        self.loading_started = 0.0
+        # Categoria que o stream entrega primeiro: a que estava na tela ao começar.
+        self.loading_first_group: Optional[int] = None
+        self.loading_reconcile = False
+        self.loading_ranges: Optional[List[tuple]] = None
+        self.loaded_fingerprint: Optional[Dict[tuple, tuple]] = None
+        self.data_stale = False
+        # Um carregamento que falhou depois de pôr a lista parcial na tela.
+        self.items_incomplete = False
+        self.snapshot_saved_at = ""
+        self.snapshot_enabled = bool(store and store.remote) and APP_SETTINGS.get_bool(
+            "SNAPSHOT_ENABLED", True
+        )
+        self.consistency_check_ms = (
+            APP_SETTINGS.get_int("CONSISTENCY_CHECK_INTERVAL_S", 0) * 1000
+        )
+        self.staging = StagedChangeSet()
+        self.staging_commit: Optional[Future] = None
+        self.page_prefetch = max(0, APP_SETTINGS.get_int("PAGE_PREFETCH", 1))
+        self.page_cache = ItemPageCache(
+            max(APP_SETTINGS.get_int("PAGE_CACHE_PAGES", 64), 2 * self.page_prefetch + 1)
+        )
+        self.page_requests: set = set()
+        self.change_queue = queue.Queue()
+        self.change_feed: Optional[ChangeFeedListener] = None
+        self.item_icons: "OrderedDict[str, ImageTk.PhotoImage]" = OrderedDict()
+        self.icon_cache_hits = 0
+        self.icon_cache_misses = 0
         self.item_icon_names = {}
         self.item_display_names = {}
+        self.mapping_sizes: Dict[str, int] = {}
 
         self.log_console = LogConsole(self.root)
+        SLOW_QUERIES.log = self.log_from_thread
+        self.diagnostic_var = tk.BooleanVar(value=SLOW_QUERIES.explain)
+        self.performance_window = PerformanceWindow(self.root, METRICS)
+        self.memory_window = MemoryWindow(self.root, MEMORY_GOVERNOR)
+        self.memory_check_ms = APP_SETTINGS.get_int("MEMORY_CHECK_INTERVAL_MS", 5000)
+        self._register_memory_caches()
+
+        self.staging_var = tk.BooleanVar(value=APP_SETTINGS.get_bool("STAGING_MODE", False))
+        self.remote_paging_var = tk.BooleanVar(
+            value=APP_SETTINGS.get_bool("REMOTE_PAGING", False)
+        )
+        if self.remote_paging_var.get() and self.staging_var.get():
+            self.staging_var.set(False)
 
         self.load_item_mappings()
         self.build_ui()
 
-        self.log_message(
-            "Conectado ao banco de dados PostgreSQL.", level="INFO", source="DB"
-        )
+        if self.store:
+            self.log_message(
+                "Conectado a %s.", self.store.describe(), level="INFO", source="DB"
+            )
+        self.dispatcher.start()
+        self.root.after(self.CANCEL_CHECK_MS, self._cancel_button_tick)
+        if self.snapshot_enabled and not self.remote_paging:
+            self._load_snapshot()
         self.load_items_from_db()
 
         self.filter_by_category(self.current_category, preserve_page=True)
+        self.root.after(self.memory_check_ms, self._memory_check_tick)
+        if self.consistency_check_ms > 0:
+            self.root.after(self.consistency_check_ms, self._consistency_check_tick)
+        if self.db_pool and APP_SETTINGS.get_bool("LIVE_UPDATES", False):
+            self.start_change_feed()
+
+    def _register_memory_caches(self):
+        MEMORY_GOVERNOR.register(
+            "log_queue",
+            lambda: len(self.log_console.message_queue.queue)
+            * self.LOG_ENTRY_ESTIMATED_BYTES,
+            self._evict_log_queue,
+            priority=10,
+        )
+        MEMORY_GOVERNOR.register(
+            "trace_spans",
+            lambda: len(TRACER.spans) * self.TRACE_SPAN_ESTIMATED_BYTES,
+            self._evict_trace_spans,
+            priority=20,
+        )
+        MEMORY_GOVERNOR.register(
+            "item_icons",
+            lambda: len(self.item_icons) * self.ICON_ESTIMATED_BYTES,
+            self._evict_icons,
+            priority=30,
+        )
+        MEMORY_GOVERNOR.register(
+            "item_icon_names", lambda: self.mapping_sizes.get("item_icon_names", 0)
+        )
+        MEMORY_GOVERNOR.register(
+            "item_display_names",
+            lambda: self.mapping_sizes.get("item_display_names", 0),
+        )
+        MEMORY_GOVERNOR.register("items", self._estimate_items_size)
+
+    def _estimate_items_size(self) -> int:
+        if not self.items:
+            return 0
+        sample = self.items[0]
+        per_item = sys.getsizeof(sample) + sys.getsizeof(sample.__dict__)
+        per_item += sum(sys.getsizeof(value) for value in sample.__dict__.values())
+        return per_item * len(self.items) + sys.getsizeof(self.items)
+
+    def _evict_icons(self, target_bytes: int) -> int:
+        freed = 0
+        while self.item_icons and freed < target_bytes:
+            self.item_icons.popitem(last=False)
+            freed += self.ICON_ESTIMATED_BYTES
+        METRICS.set_gauge("icons.cached", len(self.item_icons))
+        return freed
+
+    def _evict_log_queue(self, target_bytes: int) -> int:
+        pending = self.log_console.message_queue
+        freed = 0
+        with pending.mutex:
+            while pending.queue and freed < target_bytes:
+                pending.queue.popleft()
+                freed += self.LOG_ENTRY_ESTIMATED_BYTES
+        return freed
+
+    def _evict_trace_spans(self, target_bytes: int) -> int:
+        freed = 0
+        while TRACER.spans and freed < target_bytes:
+            TRACER.spans.popleft()
+            freed += self.TRACE_SPAN_ESTIMATED_BYTES
+        return freed
+
+    def _memory_check_tick(self):
+        for name, freed in MEMORY_GOVERNOR.enforce():
+            self.log_message(
+                "Limite de memória excedido: %.1f KiB liberados de '%s'.",
+                freed / 1024,
+                name,
+                level="WARNING",
+                source="UI",
+            )
+        self.root.after(self.memory_check_ms, self._memory_check_tick)
+
+    def log_message(self, message, *args, level="INFO", source="DEFAULT"):
+        self.log_console.log_message(message, *args, level=level, source=source)
+
+    def log_from_thread(self, message, *args, level="INFO", source="DEFAULT"):
+        """log_message para threads de trabalho: o console é atualizado na thread do Tk."""
+        self.dispatcher.post(
+            functools.partial(self.log_message, message, *args, level=level, source=source)
+        )
+
+    def toggle_diagnostic_mode(self):
+        SLOW_QUERIES.explain = self.diagnostic_var.get()
+        self.log_message(
+            "Modo diagnóstico %s: consultas acima de %d ms %s com EXPLAIN (ANALYZE, BUFFERS).",
+            "ativado" if SLOW_QUERIES.explain else "desativado",
+            SLOW_QUERIES.threshold * 1000,
+            "serão registradas" if SLOW_QUERIES.explain else "não serão mais registradas",
+            level="INFO",
+            source="DB",
+        )
+
+    def start_profiling(self):
+        if not PROFILER.start(cpu=True, memory=True):
+            self.log_message(
+                "O perfilador já está em execução.", level="WARNING", source="UI"
+            )
+            return
+        self.log_message(
+            "Perfilador iniciado (cProfile + tracemalloc).", level="INFO", source="UI"
+        )
+
+    def stop_profiling(self):
+        written = PROFILER.stop()
+        if not written:
+            self.log_message(
+                "O perfilador não está em execução.", level="WARNING", source="UI"
+            )
+            return
+        self.log_message(
+            "Perfil salvo em: %s", ", ".join(written), level="INFO", source="UI"
+        )
 
-    def log_message(self, message, level="INFO", source="DEFAULT"):
-        self.log_console.log_message(message, level, source)
+    def export_trace(self):
+        file_path = filedialog.asksaveasfilename(
+            title="Salvar trace",
+            defaultextension=".json",
+            filetypes=[("Chrome Trace", "*.json"), ("Todos os arquivos", "*.*")],
+            initialfile="shopmanager_trace.json",
+        )
+        if not file_path:
+            return
+        try:
+            span_count = TRACER.export_chrome_trace(file_path)
+            self.log_message(
+                "Trace com %d spans salvo em: %s",
+                span_count,
+                file_path,
+                level="INFO",
+                source="UI",
+            )
+        except Exception as e:
+            self.log_message(f"Erro ao exportar trace: {e}", level="ERROR", source="UI")
 
     def detect_encoding(self, file_path):
         encodings = ["utf-8", "latin-1", "cp1252", "iso-8859-1", "utf-16"]
         for encoding in encodings:
             try:
                 with open(file_path, "r", encoding=encoding) as f:
-                    f.read()
+                    while f.read(1024 * 1024):
+                        pass
                 return encoding
             except (UnicodeDecodeError, UnicodeError):
                 continue
@@ -677,19 +4181,20 @@ class ItemMallEditor:
             return
 
         try:
-            encoding = self.detect_encoding(file_path)
-            with open(file_path, "r", encoding=encoding, errors="replace") as f:
-                lines = f.readlines()
-
-            for line in lines[1:]:
-                line = line.strip()
-                if not line or line.startswith(";"):
-                    continue
-
-                result = parse_line_func(line)
-                if result:
-                    key, value = result
-                    target_dict[key] = value
+            with METRICS.timer("ini.load", {"file": os.path.basename(file_path)}):
+                encoding = self.detect_encoding(file_path)
+                with open(file_path, "r", encoding=encoding, errors="replace") as f:
+                    lines = f.readlines()
+
+                for line in lines[1:]:
+                    line = line.strip()
+                    if not line or line.startswith(";"):
+                        continue
+
+                    result = parse_line_func(line)
+                    if result:
+                        key, value = result
+                        target_dict[key] = value
         except Exception as e:
             self.log_message(
                 f"Erro ao ler arquivo INI {os.path.basename(file_path)}: {e}",
@@ -697,8 +4202,8 @@ class ItemMallEditor:
                 source="DB",
             )
 
+    @METRICS.timed()
     def load_item_mappings(self):
-        start_time = time.time()
         self.item_display_names = {}
         
         data_db_dir = os.path.join(self.game_directory, "data", "db")
@@ -748,27 +4253,35 @@ class ItemMallEditor:
             parse_name_line,
             self.item_display_names,
         )
+        self.mapping_sizes = {
+            "item_icon_names": estimate_mapping_size(self.item_icon_names),
+            "item_display_names": estimate_mapping_size(self.item_display_names),
+        }
 
-        end_time = time.time()
-        self.log_message(
-            f"Tempo de leitura dos scripts INI ({self.current_lang_folder}): {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="DB",
-        )
 
     def change_language(self, folder_name):
-        """Troca a pasta de tradução e recarrega os itens."""
+        """Troca a pasta de tradução e renomeia os itens já carregados, sem ir ao DB."""
         self.current_lang_folder = folder_name
         self.log_message(f"Idioma alterado para pasta: {folder_name}", level="INFO", source="UI")
         self.load_item_mappings()
-        self.load_items_from_db()
+        for item in self.items:
+            self._apply_item_names(item)
+        self.filter_by_category(self.current_category, preserve_page=True)
 
+    @TRACER.traced()
     def load_item_icon(
         self, icon_name: str, item_id: int
     ) -> Optional[ImageTk.PhotoImage]:
         key = f"{icon_name}_{item_id}"
         if key in self.item_icons:
+            self.item_icons.move_to_end(key)
+            self.icon_cache_hits += 1
+            METRICS.increment("icons.cache_hits")
+            METRICS.set_gauge("icons.cache_hit_ratio", self._icon_cache_hit_ratio())
             return self.item_icons[key]
+        self.icon_cache_misses += 1
+        METRICS.increment("icons.cache_misses")
+        METRICS.set_gauge("icons.cache_hit_ratio", self._icon_cache_hit_ratio())
 
         icon_path = os.path.join(
             self.game_directory, "UI", "itemicon", f"{icon_name}.dds"
@@ -791,6 +4304,7 @@ class ItemMallEditor:
 
                 photo = ImageTk.PhotoImage(bg)
                 self.item_icons[key] = photo
+                METRICS.set_gauge("icons.cached", len(self.item_icons))
                 return photo
         except Exception as e:
             self.log_message(
@@ -798,6 +4312,24 @@ class ItemMallEditor:
             )
             return None
 
+    def _icon_cache_hit_ratio(self) -> float:
+        lookups = self.icon_cache_hits + self.icon_cache_misses
+        return self.icon_cache_hits / lookups if lookups else 0.0
+
+    def _publish_item_metrics(self):
+        counts: Dict[tuple, int] = {}
+        for item in self.items:
+            key = (item.item_group, item.money_unit)
+            counts[key] = counts.get(key, 0) + 1
+        METRICS.set_gauge("items.loaded", len(self.items))
+        METRICS.replace_gauges(
+            "items.count",
+            [
+                ({"item_group": group, "money_unit": money_unit}, count)
+                for (group, money_unit), count in counts.items()
+            ],
+        )
+
     def _generate_itemmall_sql_content(self, items_list: List[ItemMall]) -> str:
         sql_content = 'DROP TABLE IF EXISTS "public"."itemmall";\n\n'
         sql_content += 'CREATE TABLE "public"."itemmall" (\n'
@@ -833,6 +4365,20 @@ class ItemMallEditor:
             sql_content += f'{item.recognized_percentage}, \'{item.fortune_bag.replace("'", "''")}\''
             sql_content += f", {item.allow_buy_level}, {item.new_account_day_limit}, "
             sql_content += f"'{escaped_note}');\n"
+
+        # A chave vem depois dos dados, como num pg_dump: a carga não mantém o índice linha a linha.
+        duplicates = len(items_list) - len({item.key for item in items_list})
+        key_columns = ", ".join(f'"{column}"' for column in ITEMMALL_PRIMARY_KEY)
+        if duplicates:
+            sql_content += (
+                f"\n-- itemmall_pkey omitida: linhas com a chave ({key_columns}) "
+                f"repetida: {duplicates}.\n"
+            )
+        else:
+            sql_content += (
+                '\nALTER TABLE "public"."itemmall" ADD CONSTRAINT "itemmall_pkey" '
+                f"PRIMARY KEY ({key_columns});\n"
+            )
         return sql_content
 
     def _handle_sql_export_action(self, action: str, sql_content: str):
@@ -864,58 +4410,6 @@ class ItemMallEditor:
             self.log_message(
                 f"Arquivo SQL salvo em: {file_path}", level="INFO", source="DB"
             )
-        elif action == "execute_db":
-            if not self.db_conn:
-                self.log_message(
-                    "Não está conectado ao banco de dados para executar o script.",
-                    level="ERROR",
-                    source="DB",
-                )
-                return
-
-            self.log_message(
-                "AVISO: Esta operação irá APAGAR e REINSERIR todos os itens da tabela itemmall no banco de dados.",
-                level="WARNING",
-                source="DB",
-            )
-            try:
-                cursor = self.db_conn.cursor()
-                self.log_message(
-                    "Iniciando execução do script SQL no banco de dados...",
-                    level="INFO",
-                    source="DB",
-                )
-
-                commands = [
-                    cmd.strip() for cmd in sql_content.split(";") if cmd.strip()
-                ]
-
-                for cmd in commands:
-                    if cmd:
-                        cursor.execute(cmd)
-                        self.db_conn.commit()
-
-                self.log_message(
-                    "Script SQL executado no banco de dados com sucesso.",
-                    level="INFO",
-                    source="DB",
-                )
-                cursor.close()
-                self.load_items_from_db()
-            except PgError as e:
-                self.db_conn.rollback()
-                self.log_message(
-                    f"Erro ao executar script no DB: {e}",
-                    level="ERROR",
-                    source="DB",
-                )
-            except Exception as e:
-                self.db_conn.rollback()
-                self.log_message(
-                    f"Erro inesperado ao executar script no DB: {str(e)}",
-                    level="ERROR",
-                    source="DB",
-                )
         else:
             self.log_message(
                 "Ação desconhecida para exportação de SQL.",
@@ -923,30 +4417,98 @@ class ItemMallEditor:
                 source="UI",
             )
 
+    @METRICS.timed()
     def export_sql(self, action: str):
-        start_time = time.time()
+        if action == "execute_db":
+            # Repetido após a confirmação: o diálogo modal deixa a fila da interface andar.
+            if not self._require_complete_items("aplicar os itens no DB"):
+                return
+        elif not self._require_full_table("exportar o SQL"):
+            return
         try:
             self.log_message("Gerando script SQL...", level="INFO", source="DB")
             sorted_items = sorted(
                 self.items, key=lambda x: (x.item_group, x.item_index, x.money_unit)
             )
+            if action == "execute_db":
+                self.apply_items_to_db(sorted_items)
+                return
             sql_content = self._generate_itemmall_sql_content(sorted_items)
             self._handle_sql_export_action(action, sql_content)
         except Exception as e:
             self.log_message(
                 f"Erro ao exportar SQL: {str(e)}", level="ERROR", source="UI"
             )
-        finally:
-            end_time = time.time()
+
+    def confirm_apply_items_to_db(self):
+        if not self._require_complete_items("aplicar os itens no DB"):
+            return
+        if messagebox.askyesno(
+            "Confirmar Aplicação",
+            f"Substituir todos os itens da tabela itemmall pelos {len(self.items)} itens carregados?",
+        ):
+            self.export_sql("execute_db")
+
+    @METRICS.timed()
+    def apply_items_to_db(self, items_list: List[ItemMall]):
+        """Substitui o conteúdo de itemmall pelos itens em memória numa única transação."""
+        if not self.store:
             self.log_message(
-                f"Tempo de execução export_sql: {end_time - start_time:.4f} segundos",
-                level="INFO",
+                "Não está conectado ao banco de dados para executar o script.",
+                level="ERROR",
                 source="DB",
             )
+            return
+
+        self.log_message(
+            "AVISO: Esta operação irá APAGAR e REINSERIR todos os itens da tabela itemmall no banco de dados.",
+            level="WARNING",
+            source="DB",
+        )
+        self.log_message(
+            "Aplicando %d itens em %s...",
+            len(items_list),
+            self.store.describe(),
+            level="INFO",
+            source="DB",
+        )
+        items_list = [ItemMall(*item.values()) for item in items_list]
+
+        def replace():
+            with METRICS.timer("db.replace_items", {"store": self.store.name}):
+                self.store.replace_items(items_list)
+
+        def done(future: Future):
+            self._set_load_status("")
+            try:
+                future.result()
+            except self.store.errors as e:
+                self.log_message(
+                    f"Erro ao executar script no DB: {e}",
+                    level="ERROR",
+                    source="DB",
+                )
+            except Exception as e:
+                self.log_message(
+                    f"Erro inesperado ao executar script no DB: {str(e)}",
+                    level="ERROR",
+                    source="DB",
+                )
+            else:
+                self.log_message(
+                    "Itens aplicados no banco de dados com sucesso.",
+                    level="INFO",
+                    source="DB",
+                )
+                self._restore_change_trigger()
+                self.load_items_from_db()
+
+        self._set_load_status("Aplicando itens no DB...")
+        self.executor.submit("write", replace, on_done=done)
 
+    @METRICS.timed()
     def run_sql_file_on_db(self):
-        start_time = time.time()
-        if not self.db_conn:
+        if not self.store:
             self.log_message(
                 "Não está conectado ao banco de dados para rodar um arquivo SQL.",
                 level="ERROR",
@@ -966,76 +4528,243 @@ class ItemMallEditor:
             )
             return
 
-        self.log_message(
-            f"AVISO: Esta operação irá APAGAR e REINSERIR os dados na tabela 'itemmall' "
-            f"do banco de dados com o conteúdo de '{os.path.basename(file_path)}'.",
-            level="WARNING",
-            source="DB",
-        )
-
-        try:
+        self.log_message(
+            f"AVISO: Esta operação irá APAGAR e REINSERIR os dados na tabela 'itemmall' "
+            f"do banco de dados com o conteúdo de '{os.path.basename(file_path)}'.",
+            level="WARNING",
+            source="DB",
+        )
+
+        def execute() -> int:
+            encoding = self.detect_encoding(file_path)
+            total_chars = max(1, os.path.getsize(file_path))
+            with open(file_path, "r", encoding=encoding, errors="replace") as f:
+                reader = SqlStatementReader(f)
+
+                def report_progress(statements: int):
+                    percent = min(100.0, 100 * reader.chars_read / total_chars)
+                    self.dispatcher.post(
+                        self._set_load_status,
+                        f"Executando SQL... {statements} instruções",
+                        percent,
+                    )
+
+                with METRICS.timer("db.run_sql_script", {"store": self.store.name}):
+                    return self.store.execute_statements(
+                        reader, self.sql_insert_batch_rows, report_progress
+                    )
+
+        def done(future: Future):
+            self._set_load_status("")
+            try:
+                statements = future.result()
+            except FileNotFoundError:
+                self.log_message(
+                    f"Arquivo não encontrado: {file_path}", level="ERROR", source="DB"
+                )
+            except self.store.errors as e:
+                self.log_message(
+                    f"Erro ao rodar arquivo SQL no DB: {e}", level="ERROR", source="DB"
+                )
+            except Exception as e:
+                self.log_message(
+                    f"Erro inesperado ao rodar arquivo SQL no DB: {e}",
+                    level="ERROR",
+                    source="DB",
+                )
+            else:
+                METRICS.increment("db.sql_statements", statements)
+                self.log_message(
+                    "Arquivo SQL '%s' executado no banco de dados com sucesso! (%d instruções)",
+                    os.path.basename(file_path),
+                    statements,
+                    level="INFO",
+                    source="DB",
+                )
+                self._restore_change_trigger()
+                self.load_items_from_db()
+
+        self.log_message(
+            f"Iniciando execução do arquivo SQL '{file_path}' no banco de dados...",
+            level="INFO",
+            source="DB",
+        )
+        self._set_load_status("Executando SQL...", 0)
+        self.executor.submit("write", execute, on_done=done)
+
+    @METRICS.timed()
+    def sync_items_to_db(self):
+        if not self._require_complete_items("sincronizar os itens no DB"):
+            return
+        sorted_items = [
+            ItemMall(*item.values())
+            for item in sorted(
+                self.items, key=lambda x: (x.item_group, x.item_index, x.money_unit)
+            )
+        ]
+        self._sync_to_db(
+            lambda sync: sync.load_items(sorted_items), "itens carregados", reload=False
+        )
+
+    def check_itemmall_schema(self):
+        """Mostra quais consultas frequentes têm índice e oferece criar a chave primária."""
+
+        def report_ready(report: Optional[SchemaReport]):
+            if report is None:
+                return
+            lines = [
+                f"{'✔' if index else '✘'} {label}: {index or 'sem índice (varredura completa)'}"
+                for label, index in report.coverage
+            ]
+            key = ", ".join(ITEMMALL_PRIMARY_KEY)
+            if report.has_primary_key:
+                messagebox.showinfo("Índices de itemmall", "\n".join(lines))
+                return
+            if not report.can_create_primary_key:
+                lines.append(
+                    f"\nA chave primária ({key}) não pode ser criada: "
+                    f"{report.duplicate_keys} chaves aparecem mais de uma vez."
+                )
+                if all(index for _, index in report.coverage):
+                    messagebox.showwarning("Índices de itemmall", "\n".join(lines))
+                    return
+                lines.append(f"Criar o índice comum itemmall_key_idx ({key}) no lugar?")
+                if messagebox.askyesno("Índices de itemmall", "\n".join(lines), icon="warning"):
+                    self._execute_db_operation(
+                        "create_key_index",
+                        msg_success="Índice itemmall_key_idx criado.",
+                        msg_fail="Erro ao criar o índice itemmall_key_idx",
+                    )
+                return
+            lines.append(f"\nCriar a chave primária itemmall_pkey ({key})?")
+            if messagebox.askyesno("Índices de itemmall", "\n".join(lines)):
+                self._execute_db_operation(
+                    "create_primary_key",
+                    msg_success="Chave primária itemmall_pkey criada.",
+                    msg_fail="Erro ao criar a chave primária de itemmall",
+                )
+
+        self._execute_db_operation(
+            "schema_report",
+            msg_success="Índices de itemmall verificados.",
+            msg_fail="Erro ao verificar os índices de itemmall",
+            on_done=report_ready,
+            lane="read",
+        )
+
+    @METRICS.timed()
+    def sync_sql_file_to_db(self):
+        file_path = filedialog.askopenfilename(
+            title="Selecionar arquivo SQL para sincronizar com o DB",
+            filetypes=[("Arquivos SQL", "*.sql"), ("Todos os arquivos", "*.*")],
+        )
+        if not file_path:
+            self.log_message(
+                "Sincronização de arquivo SQL cancelada pelo usuário.",
+                level="WARNING",
+                source="UI",
+            )
+            return
+
+        def load(sync: ItemMallSync):
             encoding = self.detect_encoding(file_path)
             with open(file_path, "r", encoding=encoding, errors="replace") as f:
-                sql_content = f.read()
+                sync.load_statements(SqlStatementReader(f), self.sql_insert_batch_rows)
 
-            cursor = self.db_conn.cursor()
+        self._sync_to_db(load, os.path.basename(file_path))
+
+    def _sync_to_db(
+        self, load: Callable[[ItemMallSync], None], source_name: str, reload: bool = True
+    ):
+        if not self.db_pool:
             self.log_message(
-                f"Iniciando execução do arquivo SQL '{file_path}' no banco de dados...",
-                level="INFO",
+                "A sincronização exige uma conexão com o PostgreSQL.",
+                level="ERROR",
                 source="DB",
             )
+            return
 
-            commands = [
-                cmd.strip()
-                for cmd in re.split(r";\s*$", sql_content, flags=re.MULTILINE)
-                if cmd.strip()
-            ]
+        def diff() -> tuple:
+            with self.db_pool.connection("bulk") as conn:
+                with METRICS.timer("db.sync.diff"):
+                    sync = ItemMallSync(conn)
+                    load(sync)
+                    preview = sync.preview()
+                # O rollback descarta a tabela temporária e libera a faixa "write"
+                # enquanto o usuário decide; apply() recalcula a diferença sob lock.
+                conn.rollback()
+            return sync, preview
+
+        def apply() -> ItemChangeSet:
+            with self.db_pool.connection("bulk") as conn:
+                with METRICS.timer("db.sync.apply"):
+                    sync = ItemMallSync(conn)
+                    load(sync)
+                    applied = sync.apply()
+                    conn.commit()
+            return applied
+
+        def result(future: Future):
+            try:
+                return future.result()
+            except PgError as e:
+                self.log_message(
+                    f"Erro ao sincronizar com o DB: {e}", level="ERROR", source="DB"
+                )
+            except Exception as e:
+                self.log_message(
+                    f"Erro inesperado ao sincronizar com o DB: {e}",
+                    level="ERROR",
+                    source="DB",
+                )
+            return None
 
-            for cmd in commands:
-                try:
-                    cursor.execute(cmd)
-                    self.db_conn.commit()
-                except PgError as statement_error:
-                    self.db_conn.rollback()
-                    self.log_message(
-                        f"Erro ao executar comando do arquivo SQL: {statement_error}\nComando: {cmd[:200]}...",
-                        level="ERROR",
-                        source="DB",
-                    )
-                    cursor.close()
-                    return
+        def previewed(future: Future):
+            outcome = result(future)
+            if outcome is None:
+                return
+            sync, preview = outcome
+            if sync.skipped_statements:
+                self.log_message(
+                    "%d instruções que não são INSERTs em itemmall foram ignoradas na sincronização.",
+                    sync.skipped_statements,
+                    level="WARNING",
+                    source="DB",
+                )
+            if preview.is_empty:
+                self.log_message(
+                    "Nenhuma diferença entre '%s' e a tabela itemmall.",
+                    source_name,
+                    level="INFO",
+                    source="DB",
+                )
+                return
+            if not SyncPreviewDialog(self.root, preview, source_name).confirmed:
+                self.log_message(
+                    "Sincronização cancelada pelo usuário.",
+                    level="WARNING",
+                    source="UI",
+                )
+                return
+            self.executor.submit("write", apply, on_done=applied)
 
-            cursor.close()
+        def applied(future: Future):
+            changes = result(future)
+            if changes is None:
+                return
             self.log_message(
-                f"Arquivo SQL '{os.path.basename(file_path)}' executado no banco de dados com sucesso!",
+                "Sincronização com '%s' concluída: %d inseridos, %d alterados, %d removidos.",
+                source_name,
+                changes.insert_count,
+                changes.update_count,
+                changes.delete_count,
                 level="INFO",
                 source="DB",
             )
-            self.load_items_from_db()
+            if reload:
+                self.load_items_from_db()
 
-        except FileNotFoundError:
-            self.log_message(
-                f"Arquivo não encontrado: {file_path}", level="ERROR", source="DB"
-            )
-        except PgError as e:
-            self.db_conn.rollback()
-            self.log_message(
-                f"Erro ao rodar arquivo SQL no DB: {e}", level="ERROR", source="DB"
-            )
-        except Exception as e:
-            self.db_conn.rollback()
-            self.log_message(
-                f"Erro inesperado ao rodar arquivo SQL no DB: {e}",
-                level="ERROR",
-                source="DB",
-            )
-        finally:
-            end_time = time.time()
-            self.log_message(
-                f"Tempo de execução run_sql_file_on_db: {end_time - start_time:.4f} segundos",
-                level="INFO",
-                source="DB",
-            )
+        self.executor.submit("write", diff, on_done=previewed)
 
     def build_ui(self):
         style = ttk.Style(self.root)
@@ -1082,6 +4811,9 @@ class ItemMallEditor:
         )
 
         filemenu.add_command(label="🔄 Recarregar DB", command=self.load_items_from_db)
+        filemenu.add_command(
+            label="✔️ Verificar Consistência", command=self.verify_consistency
+        )
         filemenu.add_command(
             label="💾 Salvar SQL", command=lambda: self.export_sql("save")
         )
@@ -1091,13 +4823,60 @@ class ItemMallEditor:
         filemenu.add_command(
             label="📋 Copiar SQL", command=lambda: self.export_sql("copy_db")
         )
+        filemenu.add_command(
+            label="⬆️ Aplicar Itens no DB", command=self.confirm_apply_items_to_db
+        )
+        filemenu.add_command(
+            label="🔁 Sincronizar Itens no DB", command=self.sync_items_to_db
+        )
+        filemenu.add_command(
+            label="🔁 Sincronizar Arquivo SQL no DB", command=self.sync_sql_file_to_db
+        )
+        filemenu.add_command(
+            label="🧰 Verificar Índices da Tabela", command=self.check_itemmall_schema
+        )
 
+        filemenu.add_separator()
+        filemenu.add_checkbutton(
+            label="🗂️ Preparar Alterações (commit em lote)",
+            variable=self.staging_var,
+            command=self.toggle_staging,
+        )
+        filemenu.add_command(
+            label="✅ Confirmar Alterações", command=self.commit_staged_changes
+        )
+        filemenu.add_command(
+            label="↩️ Descartar Alterações", command=self.discard_staged_changes
+        )
+        filemenu.add_checkbutton(
+            label="📄 Paginação no Servidor",
+            variable=self.remote_paging_var,
+            command=self.toggle_remote_paging,
+        )
         filemenu.add_separator()
         filemenu.add_command(label="🔄 Alterar Loja", command=self.switch_money_unit)
         filemenu.add_separator()
         filemenu.add_command(
             label="📜 Mostrar Log", command=self.log_console.create_log_window
         )
+        filemenu.add_command(
+            label="📊 Desempenho", command=self.performance_window.show
+        )
+        filemenu.add_checkbutton(
+            label="🩺 Modo Diagnóstico (EXPLAIN das consultas lentas)",
+            variable=self.diagnostic_var,
+            command=self.toggle_diagnostic_mode,
+        )
+        filemenu.add_command(
+            label="🔬 Iniciar Perfil (CPU + Memória)", command=self.start_profiling
+        )
+        filemenu.add_command(
+            label="⏹️ Parar e Salvar Perfil", command=self.stop_profiling
+        )
+        filemenu.add_command(
+            label="🧵 Exportar Trace (Chrome/Perfetto)", command=self.export_trace
+        )
+        filemenu.add_command(label="🧠 Memória", command=self.memory_window.show)
 
         langmenu = tk.Menu(
             menubar,
@@ -1138,6 +4917,10 @@ class ItemMallEditor:
         )
         self.nome_loja_label.pack()
 
+        self.stale_label = tk.Label(
+            topbar, text="", font=("Tahoma", 10, "bold"), bg="#2C3E50", fg="#F39C12"
+        )
+
         self.cat_frame = tk.Frame(self.root, bg="#2C3E50")
         self.cat_frame.pack(pady=(0, 15))
 
@@ -1159,6 +4942,23 @@ class ItemMallEditor:
         pag_frame = tk.Frame(self.root, bg="#2C3E50")
         pag_frame.pack(fill=tk.X, pady=(8, 18), padx=0)
 
+        self.staging_bar = tk.Frame(self.root, bg="#34495E", relief="solid", bd=1)
+        self.staging_label = tk.Label(
+            self.staging_bar,
+            text="",
+            font=("Tahoma", 10, "bold"),
+            bg="#34495E",
+            fg="#F39C12",
+        )
+        self.staging_label.pack(side=tk.LEFT, padx=10, pady=4)
+        ttk.Button(
+            self.staging_bar, text="Descartar", command=self.discard_staged_changes
+        ).pack(side=tk.RIGHT, padx=5, pady=4)
+        ttk.Button(
+            self.staging_bar, text="Confirmar", command=self.commit_staged_changes
+        ).pack(side=tk.RIGHT, padx=5, pady=4)
+        self.pag_frame = pag_frame
+
         pag_inner = tk.Frame(pag_frame, bg="#2C3E50")
         pag_inner.pack(anchor="center")
 
@@ -1176,6 +4976,15 @@ class ItemMallEditor:
         self.info_label = ttk.Label(pag_frame, text="", font=("Tahoma", 10))
         self.info_label.pack(side=tk.RIGHT, padx=30)
 
+        self.status_label = ttk.Label(pag_frame, text="", font=("Tahoma", 10))
+        self.status_label.pack(side=tk.LEFT, padx=(30, 10))
+        self.load_progress = ttk.Progressbar(
+            pag_frame, orient=tk.HORIZONTAL, length=160, mode="determinate"
+        )
+        self.cancel_button = ttk.Button(
+            pag_frame, text="⏹ Cancelar", command=self.cancel_db_operations
+        )
+
     def get_nome_loja(self):
         return (
             "🏪 Loja de Pontos"
@@ -1191,6 +5000,7 @@ class ItemMallEditor:
             f"Loja alterada para: {self.get_nome_loja()}", level="INFO", source="UI"
         )
 
+    @METRICS.timed()
     def filter_by_category(self, category_id: int, preserve_page: bool = False):
         self.current_category = category_id
         if not preserve_page:
@@ -1202,6 +5012,10 @@ class ItemMallEditor:
             else:
                 btn.state(["!pressed"])
 
+        if self.remote_paging:
+            self._show_remote_page()
+            return
+
         self.filtered_items = [
             item
             for item in self.items
@@ -1226,7 +5040,7 @@ class ItemMallEditor:
                 break
 
         self.log_message(
-            f"Filtrando por categoria: {category_name}", level="INFO", source="UI"
+            "Filtrando por categoria: %s", category_name, level="INFO", source="UI"
         )
 
     def truncate_text(self, text, max_length=20):
@@ -1235,13 +5049,15 @@ class ItemMallEditor:
         return text
 
     def build_card(self, parent, item: ItemMall):
+        dirty = self.staging.is_dirty(item)
         card = tk.Frame(
             parent,
             bg="#34495E",
             width=260,
             height=120,
-            highlightthickness=1,
-            highlightcolor="#BDC3C7",
+            highlightthickness=2 if dirty else 1,
+            highlightbackground="#F39C12" if dirty else "#34495E",
+            highlightcolor="#F39C12" if dirty else "#BDC3C7",
             bd=0,
         )
         card.grid_propagate(False)
@@ -1298,6 +5114,10 @@ class ItemMallEditor:
         lbl_nome.pack(side=tk.LEFT, fill=tk.X, expand=True)
         if len(item.display_name) > 20:
             Tooltip(lbl_nome, item.display_name)
+        if dirty:
+            tk.Label(
+                top_row, text="●", font=("Tahoma", 10), bg="#34495E", fg="#F39C12"
+            ).pack(side=tk.RIGHT)
 
         price_row = tk.Frame(card, bg="#34495E")
         price_row.pack(fill=tk.X, padx=10, pady=(0, 8))
@@ -1341,32 +5161,57 @@ class ItemMallEditor:
         bind_click(price_row)
         return card
 
+    def _filtered_count(self) -> int:
+        if not self.remote_paging:
+            return len(self.filtered_items)
+        count = self._range_count(self.current_category, self.current_money_unit)
+        return min(count, 8) if self.current_category == 50 else count
+
+    def _range_count(self, category_id: int, money_unit: int) -> int:
+        if self.remote_paging:
+            stats = self.page_cache.stats.get((category_id, money_unit))
+            if stats is not None:
+                return stats[0]
+        return sum(
+            1
+            for item in self.items
+            if item.item_group == category_id and item.money_unit == money_unit
+        )
+
     def _get_total_pages(self):
-        total_items = len(self.filtered_items)
+        total_items = self._filtered_count()
         total_pages = max(
             1, (total_items + self.items_per_page - 1) // self.items_per_page
         )
         if (
             total_items > 0
             and total_items % self.items_per_page == 0
-            and (self.current_category != 50 or len(self.filtered_items) < 8)
+            and (self.current_category != 50 or total_items < 8)
         ):
             total_pages += 1
         return total_pages
 
+    @METRICS.timed()
     def refresh_cards(self):
         for widget in self.cards_frame.winfo_children():
             widget.destroy()
 
-        total_items = len(self.filtered_items)
+        total_items = self._filtered_count()
         total_pages = self._get_total_pages()
 
-        if self.current_page >= total_pages:
+        # No modo paginado, _show_remote_page já ajustou a página com a contagem do servidor.
+        if self.current_page >= total_pages and not self.remote_paging:
             self.current_page = max(0, total_pages - 1)
 
         start_idx = self.current_page * self.items_per_page
         end_idx = min(start_idx + self.items_per_page, total_items)
-        page_items = self.filtered_items[start_idx:end_idx]
+        page_loaded = True
+        if self.remote_paging:
+            cached = self.page_cache.get(self._range_key(), self.current_page)
+            page_loaded = cached is not None
+            page_items = (cached or [])[: max(0, end_idx - start_idx)]
+        else:
+            page_items = self.filtered_items[start_idx:end_idx]
 
         cols = 3
         rows = 4
@@ -1380,9 +5225,10 @@ class ItemMallEditor:
                 f = self.build_card(self.cards_frame, item)
                 f.grid(row=row, column=col, padx=18, pady=14, sticky="nsew")
             elif (
-                self.current_page == total_pages - 1
+                page_loaded
+                and self.current_page == total_pages - 1
                 and idx == len(page_items)
-                and (self.current_category != 50 or len(self.filtered_items) < 8)
+                and (self.current_category != 50 or total_items < 8)
             ):
                 plus = tk.Frame(
                     self.cards_frame,
@@ -1440,130 +5286,865 @@ class ItemMallEditor:
     def prev_page(self):
         total_pages = self._get_total_pages()
 
-        if self.current_page > 0:
-            self.current_page -= 1
-        else:
-            self.current_page = total_pages - 1
-        self.refresh_cards()
+        if self.current_page > 0:
+            self.current_page -= 1
+        else:
+            self.current_page = total_pages - 1
+        self._show_current_page()
+        self.log_message(
+            "Página anterior. Atual: %d",
+            self.current_page + 1,
+            level="INFO",
+            source="UI",
+        )
+
+    def next_page(self):
+        total_pages = self._get_total_pages()
+
+        if self.current_page < total_pages - 1:
+            self.current_page += 1
+        else:
+            self.current_page = 0
+        self._show_current_page()
+        self.log_message(
+            "Próxima página. Atual: %d", self.current_page + 1, level="INFO", source="UI"
+        )
+
+    def _show_current_page(self):
+        if self.remote_paging:
+            self._show_remote_page()
+        else:
+            self.refresh_cards()
+
+    @property
+    def remote_paging(self) -> bool:
+        return bool(self.store) and self.remote_paging_var.get()
+
+    def _range_key(self) -> tuple:
+        return (self.current_category, self.current_money_unit)
+
+    def _show_remote_page(self):
+        range_key = self._range_key()
+        if range_key in self.page_cache.stats:
+            self.current_page = min(self.current_page, self._get_total_pages() - 1)
+        if (
+            range_key not in self.page_cache.stats
+            or self.page_cache.get(range_key, self.current_page) is None
+        ):
+            self._set_load_status("Carregando página...")
+            self._fetch_page(range_key, self.current_page)
+        else:
+            self._set_load_status("")
+            self._prefetch_pages(range_key)
+        self.refresh_cards()
+
+    def _prefetch_pages(self, range_key: tuple):
+        total_pages = self._get_total_pages()
+        for distance in range(1, self.page_prefetch + 1):
+            for page in (self.current_page + distance, self.current_page - distance):
+                if not 0 <= page < total_pages or (range_key, page) in self.page_cache.pages:
+                    continue
+                if any(self.page_cache.bounds(range_key, page)):
+                    self._fetch_page(range_key, page)
+
+    def _fetch_page(self, range_key: tuple, page: int):
+        request = (range_key, page)
+        if request in self.page_requests:
+            return
+        self.page_requests.add(request)
+        generation = self.page_cache.generation
+        stats = self.page_cache.stats.get(range_key)
+        after, before = self.page_cache.bounds(range_key, page)
+        limit = self.items_per_page
+        group, money_unit = range_key
+
+        def fetch() -> tuple:
+            with SLOW_QUERIES.operation("fetch_page"):
+                known = stats or self.store.range_stats(group, money_unit)
+                remaining = known[0] - page * limit
+                if remaining <= 0:
+                    strategy, rows = "empty", []
+                elif after or before:
+                    strategy = "keyset"
+                    rows = self.store.fetch_page(
+                        group, money_unit, limit, after=after, before=before
+                    )
+                elif page == 0:
+                    strategy = "keyset"
+                    rows = self.store.fetch_page(
+                        group, money_unit, limit, after=self.store.MIN_KEY
+                    )
+                elif remaining <= limit:
+                    # A última página é lida de trás para frente, sem percorrer as anteriores.
+                    strategy = "keyset"
+                    rows = self.store.fetch_page(
+                        group, money_unit, remaining, before=self.store.MAX_KEY
+                    )
+                else:
+                    strategy = "offset"
+                    rows = self.store.fetch_page(
+                        group, money_unit, limit, offset=page * limit
+                    )
+                METRICS.increment("db.page.fetch", labels={"strategy": strategy})
+                return known, rows
+
+        def done(future: Future):
+            self.page_requests.discard(request)
+            if generation != self.page_cache.generation:
+                return
+            try:
+                known, rows = future.result()
+            except Exception as e:
+                if request == (self._range_key(), self.current_page):
+                    self._set_load_status("")
+                self.log_message(
+                    f"Erro ao carregar página do DB: {e}", level="ERROR", source="DB"
+                )
+                return
+            self.page_cache.stats[range_key] = known
+            self.page_cache.put(range_key, page, [self._row_to_item(row) for row in rows])
+            self.items = self.page_cache.items()
+            self._rebuild_item_index()
+            if range_key != self._range_key():
+                return
+            if page == self.current_page:
+                self._show_remote_page()
+            elif abs(page - self.current_page) <= self.page_prefetch:
+                self._prefetch_pages(range_key)
+
+        self.executor.submit("read", fetch, on_done=done)
+
+    def _invalidate_pages(self):
+        self.page_cache.clear()
+        self.page_requests.clear()
+        self._fetch_page(self._range_key(), self.current_page)
+
+    def toggle_remote_paging(self):
+        if self.remote_paging_var.get() and (len(self.staging) or self.staging_var.get()):
+            self.remote_paging_var.set(False)
+            self.log_message(
+                "Desative o modo de preparação antes de ativar a paginação no servidor.",
+                level="WARNING",
+                source="UI",
+            )
+            return
+        # Abandona um carregamento completo em andamento e recomeça no modo escolhido.
+        self.load_generation += 1
+        self.loading_items = None
+        self.items = []
+        self.items_incomplete = False
+        self.loaded_fingerprint = None
+        self._rebuild_item_index()
+        self.page_cache.clear()
+        self.page_requests.clear()
+        self._set_load_status("")
+        self.log_message(
+            "Paginação no servidor %s.",
+            "ativada" if self.remote_paging else "desativada",
+            level="INFO",
+            source="UI",
+        )
+        self.load_items_from_db()
+        self.filter_by_category(self.current_category, preserve_page=True)
+
+    def _require_full_table(self, action: str) -> bool:
+        if not self.remote_paging:
+            return True
+        self.log_message(
+            "Desative a paginação no servidor para %s: só as páginas visitadas estão em memória.",
+            action,
+            level="WARNING",
+            source="UI",
+        )
+        return False
+
+    def _require_complete_items(self, action: str) -> bool:
+        """Se self.items pode substituir a tabela: completo, conferido com o DB e sem escrita pendente."""
+        if not self._require_full_table(action):
+            return False
+        reason = None
+        if self.is_loading:
+            reason = "aguarde o fim do carregamento dos itens"
+        elif self.items_incomplete:
+            reason = "o último carregamento falhou e a lista está incompleta; use Recarregar DB"
+        elif self.data_stale:
+            reason = "os itens vêm do snapshot local e ainda não foram conferidos com o DB"
+        elif self.executor.busy("write"):
+            reason = "há escritas no DB em andamento"
+        if reason is None:
+            return True
+        self.log_message(
+            "Não é possível %s: %s.", action, reason, level="WARNING", source="UI"
+        )
+        return False
+
+    def edit_item_popup(self, item: ItemMall):
+        if self.staging_var.get():
+            self.staging.remember(item)
+        ItemDialog(
+            self.root, item, self.after_edit_item, self.categories, self, is_edit=True
+        )
+        self.log_message(
+            f"Abrindo editor para o item: {item.display_name} (ID: {item.item_id})",
+            level="INFO",
+            source="UI",
+        )
+
+    @METRICS.timed()
+    def after_edit_item(self, item: ItemMall):
+        if self.staging_var.get():
+            self._rebuild_item_index()
+            self._refresh_after_staged_change()
+            return
+        self.update_item_in_db(item, on_done=self._after_item_write)
+
+    def get_next_index_for_category(self, category_id: int, money_unit: int) -> int:
+        stats = self.page_cache.stats.get((category_id, money_unit))
+        if self.remote_paging and stats is not None:
+            return stats[1] + 1
+        category_items = [
+            item
+            for item in self.items
+            if item.item_group == category_id and item.money_unit == money_unit
+        ]
+        if not category_items:
+            return 1
+        max_index = max(item.item_index for item in category_items)
+        return max_index + 1
+
+    def load_items_from_db(self):
+        if not self.store:
+            self.log_message(
+                "Não está em modo de banco de dados para carregar itens.",
+                level="ERROR",
+                source="DB",
+            )
+            return
+
+        if self.remote_paging:
+            self._invalidate_pages()
+            return
+
+        self.load_generation += 1
+        generation = self.load_generation
+        self.loading_items = []
+        self.loading_swapped = False
+        self.loading_reconcile = bool(self.items)
+        self.loading_ranges = None
+        self.loading_started = time.perf_counter()
+        self.loading_first_group = self.current_category
+        self._set_load_status("Carregando itens do DB...", 0)
+        self.executor.submit(
+            "read",
+            self._stream_items_worker,
+            generation,
+            self.loaded_fingerprint if self.items else None,
+            self.loading_first_group,
+        )
+
+    @property
+    def is_loading(self) -> bool:
+        return self.loading_items is not None
+
+    def _stream_items_worker(
+        self, generation: int, known_fingerprint: Optional[Dict], first_group: int
+    ):
+        stream = self.store.stream_items(known_fingerprint, self.load_batch_size, first_group)
+        try:
+            with SLOW_QUERIES.operation("load_items_from_db"), METRICS.timer(
+                "db.stream_items", {"store": self.store.name}
+            ):
+                for kind, payload in stream:
+                    self.dispatcher.post(self._on_stream_message, kind, generation, payload)
+                    if generation != self.load_generation:
+                        break
+        except Exception as e:
+            self.dispatcher.post(self._on_stream_message, "error", generation, e)
+        finally:
+            stream.close()
+
+    def _on_stream_message(self, kind: str, generation: int, payload):
+        if generation != self.load_generation:
+            return
+        if kind == "plan":
+            self.loading_ranges = payload
+            if payload is not None:
+                self.loading_reconcile = True
+        elif kind == "total":
+            self.loading_total = payload
+        elif kind == "rows":
+            self._apply_streamed_rows(payload)
+        elif kind == "done":
+            self._finish_item_stream(payload)
+        elif kind == "error":
+            incomplete = self.loading_swapped
+            self.loading_items = None
+            self._set_load_status("")
+            if incomplete:
+                # A lista parcial já está na tela; a próxima carga precisa ler a tabela toda.
+                self.items_incomplete = True
+                self.loaded_fingerprint = None
+                self.stale_label.config(
+                    text="⚠️ Carregamento interrompido — a lista de itens está incompleta; "
+                    "use Recarregar DB"
+                )
+                if not self.stale_label.winfo_ismapped():
+                    self.stale_label.pack(pady=(0, 5))
+            elif self.data_stale:
+                self._set_stale_indicator("DB indisponível")
+            self.log_message(
+                f"Erro ao carregar itens do DB: {payload}",
+                level="ERROR",
+                source="DB",
+            )
+
+    def _apply_streamed_rows(self, rows):
+        batch = [self._row_to_item(row) for row in rows]
+        self.loading_items.extend(batch)
+        if self.loading_swapped:
+            for item in batch:
+                self.items_by_key[item.key] = item
+            if any(item.item_group == self.current_category for item in batch):
+                self.filter_by_category(self.current_category, preserve_page=True)
+        elif not self.loading_reconcile and batch[-1].item_group != self.loading_first_group:
+            # A categoria da tela veio primeiro e já está completa.
+            self.items = self.loading_items
+            self._rebuild_item_index()
+            self.loading_swapped = True
+            self.filter_by_category(self.current_category, preserve_page=True)
+        loaded = len(self.loading_items)
+        total = max(self.loading_total, loaded)
+        self._set_load_status(
+            f"Carregando itens do DB... {loaded}/{total}",
+            100 * loaded / total if total else 100,
+        )
+
+    def _finish_item_stream(self, fingerprint: Dict):
+        changed = True
+        fresh_items = self.loading_items
+        if self.loading_ranges is not None:
+            ranges = set(self.loading_ranges)
+            fresh_items = [
+                item
+                for item in self.items
+                if (item.item_group, item.money_unit) not in ranges
+            ] + fresh_items
+            METRICS.increment(
+                "db.reload.ranges", len(ranges), {"result": "changed" if ranges else "unchanged"}
+            )
+        if self.loading_reconcile:
+            changed = self._reconcile_items(fresh_items)
+        else:
+            self.items = fresh_items
+        self.loaded_fingerprint = fingerprint
+        self.loading_items = None
+        self.items_incomplete = False
+        self._rebuild_item_index()
+        self._reapply_staged_changes()
+        self._publish_item_metrics()
+        if changed:
+            self.filter_by_category(self.current_category, preserve_page=True)
+        self._set_load_status("")
+        self._set_stale_indicator(None)
+        if self.snapshot_enabled:
+            self._save_snapshot(background=True)
+        METRICS.observe("load_items_from_db", time.perf_counter() - self.loading_started)
+        if self.loading_ranges == []:
+            self.log_message(
+                "Nenhuma alteração no DB desde o último carregamento.",
+                level="INFO",
+                source="DB",
+            )
+        elif self.loading_ranges:
+            self.log_message(
+                "Recarregadas %d faixas (categoria/moeda) alteradas; %d itens no total.",
+                len(self.loading_ranges),
+                len(self.items),
+                level="INFO",
+                source="DB",
+            )
+        else:
+            self.log_message(
+                "Carregados %d itens do banco de dados.",
+                len(self.items),
+                level="INFO",
+                source="DB",
+            )
+
+    def _reconcile_items(self, fresh_items: List[ItemMall]) -> bool:
+        """Troca self.items pelas linhas recém-lidas mantendo os objetos que não mudaram."""
+        current: Dict[tuple, List[ItemMall]] = {}
+        for item in self.items:
+            current.setdefault(item.key, []).append(item)
+        reconciled = []
+        changed = 0
+        for fresh in fresh_items:
+            candidates = current.get(fresh.key)
+            existing = candidates.pop() if candidates else None
+            if existing is not None and existing.values() == fresh.values():
+                self._apply_item_names(existing)
+                reconciled.append(existing)
+            else:
+                reconciled.append(fresh)
+                changed += 1
+        removed = sum(len(items) for items in current.values())
+        self.items = reconciled
+        if changed or removed:
+            self.log_message(
+                "Itens reconciliados com o DB: %d novos ou alterados, %d removidos.",
+                changed,
+                removed,
+                level="INFO",
+                source="DB",
+            )
+        return bool(changed or removed)
+
+    def _snapshot_server(self) -> str:
+        params = self.db_pool.connect_params
+        return f"{params.get('host')}_{params.get('port')}_{params.get('dbname')}"
+
+    def _load_snapshot(self):
+        snapshot = SNAPSHOTS.load(self._snapshot_server())
+        if not snapshot:
+            return
+        rows, saved_at, self.loaded_fingerprint = snapshot
+        self.items = [self._row_to_item(row) for row in rows]
+        self._rebuild_item_index()
+        self._publish_item_metrics()
+        self.data_stale = True
+        self._set_stale_indicator(
+            "sincronizando com o DB...", time.strftime("%d/%m %H:%M", time.localtime(saved_at))
+        )
         self.log_message(
-            f"Página anterior. Atual: {self.current_page + 1}",
+            "Exibindo %d itens do snapshot local enquanto o DB é consultado.",
+            len(self.items),
             level="INFO",
-            source="UI",
+            source="DB",
         )
 
-    def next_page(self):
-        total_pages = self._get_total_pages()
+    def _save_snapshot(self, background: bool = False):
+        if self.remote_paging or self.items_incomplete:
+            return
+        server = self._snapshot_server()
+        fingerprint = self.loaded_fingerprint
+        # O snapshot guarda o estado do DB: alterações preparadas e não confirmadas ficam de fora.
+        staged = self.staging.entries
+        rows = [item.values() for item in self.items if id(item) not in staged]
+        rows.extend(entry.original for entry in staged.values() if entry.original is not None)
+
+        def save():
+            try:
+                with METRICS.timer("snapshot.save"):
+                    SNAPSHOTS.save(server, rows, fingerprint)
+            except OSError as e:
+                FILE_LOGGER.log(
+                    "Não foi possível salvar o snapshot local: %s", e, level="WARNING", source="DB"
+                )
 
-        if self.current_page < total_pages - 1:
-            self.current_page += 1
+        if background:
+            threading.Thread(target=save, name="snapshot-writer", daemon=True).start()
         else:
-            self.current_page = 0
-        self.refresh_cards()
+            save()
+
+    def _set_stale_indicator(self, reason: Optional[str], saved_at: Optional[str] = None):
+        if reason is None:
+            self.data_stale = False
+            self.stale_label.pack_forget()
+            return
+        if saved_at:
+            self.snapshot_saved_at = saved_at
+        self.stale_label.config(
+            text=f"⚠️ Dados do snapshot local de {self.snapshot_saved_at} — {reason}"
+        )
+        if not self.stale_label.winfo_ismapped():
+            self.stale_label.pack(pady=(0, 5))
+
+    def _cancel_button_tick(self):
+        busy = self.executor.busy()
+        if busy and not self.cancel_button.winfo_ismapped():
+            self.cancel_button.pack(side=tk.LEFT, padx=(0, 10))
+        elif not busy and self.cancel_button.winfo_ismapped():
+            self.cancel_button.pack_forget()
+        self.root.after(self.CANCEL_CHECK_MS, self._cancel_button_tick)
+
+    def cancel_db_operations(self):
+        if not self.store:
+            return
+        cancelled = self.store.cancel()
+        METRICS.increment("db.cancellations", cancelled)
         self.log_message(
-            f"Próxima página. Atual: {self.current_page + 1}", level="INFO", source="UI"
+            "Cancelamento pedido ao servidor para %d operações em andamento.",
+            cancelled,
+            level="WARNING",
+            source="DB",
         )
 
-    def edit_item_popup(self, item: ItemMall):
-        ItemDialog(
-            self.root, item, self.after_edit_item, self.categories, self, is_edit=True
+    def _set_load_status(self, text: str, percent: Optional[float] = None):
+        self.status_label.config(text=text)
+        if text and percent is not None:
+            self.load_progress["value"] = percent
+            if not self.load_progress.winfo_ismapped():
+                self.load_progress.pack(side=tk.LEFT, padx=(0, 10))
+        elif self.load_progress.winfo_ismapped():
+            self.load_progress.pack_forget()
+
+    def _row_to_item(self, row) -> ItemMall:
+        item = ItemMall(*row)
+        self._apply_item_names(item)
+        return item
+
+    def _apply_item_names(self, item: ItemMall):
+        item.icon_name = self.item_icon_names.get(item.item_id, "")
+        item.display_name = self.item_display_names.get(
+            item.item_id, f"Item {item.item_id}"
         )
+
+    def _rebuild_item_index(self):
+        self.items_by_key = {item.key: item for item in self.items}
+
+    def _upsert_local_item(
+        self, row, old_key: Optional[tuple] = None, item: Optional[ItemMall] = None
+    ) -> ItemMall:
+        new_key = (row[0], row[1], row[2], row[4])
+        existing = self.items_by_key.pop(old_key, None) if old_key else None
+        if existing is None:
+            existing = self.items_by_key.get(new_key)
+        if existing is None:
+            existing = item or ItemMall(*row)
+            self.items.append(existing)
+        for column, value in zip(ITEMMALL_COLUMNS, row):
+            setattr(existing, column, value)
+        self._apply_item_names(existing)
+        self.items_by_key[new_key] = existing
+        return existing
+
+    def _remove_local_items(self, key: tuple) -> int:
+        kept = [item for item in self.items if item.key != key]
+        removed = len(self.items) - len(kept)
+        self.items = kept
+        self.items_by_key.pop(key, None)
+        return removed
+
+    def _refresh_after_local_change(self):
+        if self.remote_paging:
+            self._publish_item_metrics()
+            self._invalidate_pages()
+            return
+        if self.is_loading:
+            # O stream em andamento pode ter lido o estado anterior à escrita.
+            self.load_items_from_db()
+            return
+        self._publish_item_metrics()
+        self.filter_by_category(self.current_category, preserve_page=True)
+
+    def _install_change_trigger(self) -> bool:
+        """Cria o trigger de NOTIFY em itemmall se ele não existir; True se foi criado agora."""
+        with self.db_pool.connection("write") as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_trigger WHERE tgname = 'itemmall_notify_change' "
+                    "AND tgrelid = 'public.itemmall'::regclass;"
+                )
+                installed = cursor.fetchone() is None
+                if installed:
+                    cursor.execute(ITEMMALL_CHANGE_TRIGGER_SQL)
+            conn.commit()
+        return installed
+
+    def _restore_change_trigger(self):
+        """Um script que recria itemmall leva o trigger junto; reinstala-o se as atualizações ao vivo estão ativas."""
+        if not self.change_feed:
+            return
+
+        def done(future: Future):
+            try:
+                if future.result():
+                    self.log_message(
+                        "Trigger de alterações reinstalado em itemmall.",
+                        level="INFO",
+                        source="DB",
+                    )
+            except PgError as e:
+                self.log_message(
+                    f"Não foi possível reinstalar o trigger de alterações: {e}",
+                    level="ERROR",
+                    source="DB",
+                )
+
+        self.executor.submit("write", self._install_change_trigger, on_done=done)
+
+    def start_change_feed(self):
+        def done(future: Future):
+            try:
+                if future.result():
+                    self.log_message(
+                        "Trigger de alterações instalado em itemmall.",
+                        level="INFO",
+                        source="DB",
+                    )
+            except PgError as e:
+                self.log_message(
+                    f"Não foi possível instalar o trigger de alterações: {e}",
+                    level="ERROR",
+                    source="DB",
+                )
+                return
+
+            self.change_feed = ChangeFeedListener(self.db_pool, self.change_queue.put)
+            self.change_feed.start()
+            self.root.after(self.CHANGE_POLL_MS, self._poll_change_feed)
+            self.log_message(
+                "Atualizações ao vivo ativadas (canal %s).",
+                ITEMMALL_CHANGE_CHANNEL,
+                level="INFO",
+                source="DB",
+            )
+
+        self.executor.submit("write", self._install_change_trigger, on_done=done)
+
+    def _poll_change_feed(self):
+        changes = []
+        while True:
+            try:
+                changes.extend(self.change_queue.get_nowait())
+            except queue.Empty:
+                break
+        if changes:
+            self.apply_remote_changes(changes)
+        self.root.after(self.CHANGE_POLL_MS, self._poll_change_feed)
+
+    @METRICS.timed()
+    def apply_remote_changes(self, changes: List[dict]):
+        """Aplica alterações de outros administradores; reaplicar a mesma é inócuo."""
+        if self.remote_paging:
+            self._invalidate_pages()
+            return
+        if self.is_loading or len(changes) > self.CHANGE_RELOAD_THRESHOLD or any(
+            change["op"] in ("TRUNCATE", "RESYNC") for change in changes
+        ):
+            self.load_items_from_db()
+            return
+
+        visible = False
+        staged_keys = self.staging.keys()
+        for change in changes:
+            old_key = tuple(change["old"]) if change.get("old") else None
+            new = change.get("new")
+            new_key = tuple(new[c] for c in ITEMMALL_KEY_COLUMNS) if new else None
+            if old_key in staged_keys or new_key in staged_keys:
+                continue
+            if new is None:
+                if old_key:
+                    self._remove_local_items(old_key)
+                    visible |= old_key[1] == self.current_category
+                continue
+            row = tuple(new[column] for column in ITEMMALL_COLUMNS)
+            item = self._upsert_local_item(row, old_key=old_key)
+            visible |= item.item_group == self.current_category or (
+                old_key is not None and old_key[1] == self.current_category
+            )
+        self._publish_item_metrics()
+        if visible:
+            self.filter_by_category(self.current_category, preserve_page=True)
+
+    def toggle_staging(self):
+        if self.staging_var.get() and self.remote_paging:
+            self.staging_var.set(False)
+            self.log_message(
+                "O modo de preparação não está disponível com a paginação no servidor.",
+                level="WARNING",
+                source="UI",
+            )
+            return
+        if not self.staging_var.get() and len(self.staging):
+            self.staging_var.set(True)
+            self.log_message(
+                "Confirme ou descarte as %d alterações pendentes antes de sair do modo de preparação.",
+                len(self.staging),
+                level="WARNING",
+                source="UI",
+            )
+            return
+        if not self.staging_var.get():
+            self.staging.clear()
         self.log_message(
-            f"Abrindo editor para o item: {item.display_name} (ID: {item.item_id})",
+            "Modo de preparação %s.",
+            "ativado" if self.staging_var.get() else "desativado",
             level="INFO",
             source="UI",
         )
 
-    def after_edit_item(self, item: ItemMall):
-        self.update_item_in_db(item)
-        self.load_items_from_db()
-
-    def get_next_index_for_category(self, category_id: int, money_unit: int) -> int:
-        category_items = [
-            item
-            for item in self.items
-            if item.item_group == category_id and item.money_unit == money_unit
+    def _refresh_after_staged_change(self):
+        pending = len(self.staging)
+        if pending:
+            self.staging_label.config(text=f"✏️ {pending} alterações pendentes")
+            if not self.staging_bar.winfo_ismapped():
+                self.staging_bar.pack(fill=tk.X, padx=24, pady=(8, 0), before=self.pag_frame)
+        elif self.staging_bar.winfo_ismapped():
+            self.staging_bar.pack_forget()
+        self._refresh_after_local_change()
+
+    def _reapply_staged_changes(self):
+        """Reaplica as alterações pendentes sobre uma lista recém-carregada do DB."""
+        if not self.staging.entries:
+            return
+        staged = {id(entry.item) for entry in self.staging.entries.values()}
+        replaced = set()
+        for entry in self.staging.entries.values():
+            if entry.original is not None:
+                fresh = self.items_by_key.get(ItemMall(*entry.original).key)
+                if fresh is not None and id(fresh) not in staged:
+                    replaced.add(id(fresh))
+        self.items = [
+            item for item in self.items if id(item) not in replaced and id(item) not in staged
         ]
-        if not category_items:
-            return 1
-        max_index = max(item.item_index for item in category_items)
-        return max_index + 1
+        self.items.extend(
+            entry.item for entry in self.staging.entries.values() if not entry.deleted
+        )
+        self._rebuild_item_index()
 
-    def load_items_from_db(self):
-        start_time = time.time()
-        if not self.db_conn:
+    @METRICS.timed()
+    def commit_staged_changes(self):
+        inserts, updates, deletes = self.staging.pending()
+        if not (inserts or updates or deletes):
             self.log_message(
-                "Não está em modo de banco de dados para carregar itens.",
+                "Nenhuma alteração pendente para confirmar.", level="INFO", source="DB"
+            )
+            return
+        if not self.store:
+            self.log_message(
+                "Não está conectado ao banco de dados para confirmar as alterações.",
                 level="ERROR",
                 source="DB",
             )
             return
 
-        self.items = []
-        query = """
-            SELECT item_id, item_group, item_index, item_num, money_unit, point, special_price, sell, on_sell_date,
-                   not_sell_date, account_num_limit, recognized_percentage, fortune_bag, allow_buy_level,
-                   new_account_day_limit, note
-            FROM public.itemmall
-            ORDER BY item_group, item_index, money_unit;
-        """
+        if self.staging_commit is not None:
+            self.log_message(
+                "Já existe uma confirmação de alterações em andamento.",
+                level="WARNING",
+                source="UI",
+            )
+            return
 
-        def process_rows(cursor):
-            for row in cursor.fetchall():
-                item_id = row[0]
-                item = ItemMall(
-                    item_id=item_id,
-                    item_group=row[1],
-                    item_index=row[2],
-                    item_num=row[3],
-                    money_unit=row[4],
-                    point=row[5],
-                    special_price=row[6],
-                    sell=row[7],
-                    on_sell_date=row[8],
-                    not_sell_date=row[9],
-                    account_num_limit=row[10],
-                    recognized_percentage=row[11],
-                    fortune_bag=row[12],
-                    allow_buy_level=row[13],
-                    new_account_day_limit=row[14],
-                    note=row[15],
-                    icon_name=self.item_icon_names.get(item_id, ""),
-                    display_name=self.item_display_names.get(
-                        item_id, f"Item {item_id}"
-                    ),
+        def original_key(entry: StagedEntry) -> tuple:
+            return ItemMall(*entry.original).key
+
+        written = {id(entry.item): (entry, entry.item.values()) for entry in inserts + updates}
+        written.update({id(entry.item): (entry, None) for entry in deletes})
+        insert_rows = [entry.item.values() for entry in inserts]
+        update_rows = [(entry.item.values(), original_key(entry)) for entry in updates]
+        delete_keys = [original_key(entry) for entry in deletes]
+
+        def apply():
+            with METRICS.timer("db.staging.commit", {"store": self.store.name}):
+                self.store.apply_changes(insert_rows, update_rows, delete_keys)
+
+        def done(future: Future):
+            self.staging_commit = None
+            try:
+                future.result()
+            except Exception as e:
+                self.log_message(
+                    f"Erro ao confirmar as alterações; nada foi gravado: {e}",
+                    level="ERROR",
+                    source="DB",
                 )
-                self.items.append(item)
-            self.filter_by_category(self.current_category, preserve_page=True)
+                return
+            self.staging.settle(written)
+            METRICS.increment("db.staging.rows", len(written))
             self.log_message(
-                f"Carregados {len(self.items)} itens do banco de dados.",
+                "Alterações confirmadas: %d inseridos, %d alterados, %d removidos.",
+                len(inserts),
+                len(updates),
+                len(deletes),
                 level="INFO",
                 source="DB",
             )
+            self._refresh_after_staged_change()
 
-        self._execute_db_operation(
-            query,
-            msg_success="Itens carregados do DB.",
-            msg_fail="Erro ao carregar itens do DB.",
-            callback=process_rows,
-        )
-        end_time = time.time()
+        self.staging_commit = self.executor.submit("write", apply, on_done=done)
+
+    def discard_staged_changes(self):
+        if not self.staging.entries:
+            return
+        if self.staging_commit is not None:
+            self.log_message(
+                "Aguarde a confirmação em andamento antes de descartar alterações.",
+                level="WARNING",
+                source="UI",
+            )
+            return
+        discarded = len(self.staging)
+        added = set()
+        for entry in self.staging.entries.values():
+            if entry.original is None:
+                added.add(id(entry.item))
+                continue
+            for column, value in zip(ITEMMALL_COLUMNS, entry.original):
+                setattr(entry.item, column, value)
+            self._apply_item_names(entry.item)
+            if entry.deleted:
+                self.items.append(entry.item)
+        self.items = [item for item in self.items if id(item) not in added]
+        self.staging.clear()
+        self._rebuild_item_index()
         self.log_message(
-            f"Tempo de carregamento de itens do DB: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="DB",
+            "%d alterações pendentes descartadas.", discarded, level="INFO", source="UI"
+        )
+        self._refresh_after_staged_change()
+
+    @METRICS.timed()
+    def verify_consistency(self, repair: bool = True):
+        if not self._require_full_table("verificar a consistência"):
+            return
+
+        def compare(rows: Optional[List[tuple]]):
+            if rows is None:
+                return
+            remote = sorted(tuple(row) for row in rows)
+            if remote == sorted(item.values() for item in self.items):
+                self.log_message(
+                    "Itens em memória conferem com o DB (%d linhas).",
+                    len(remote),
+                    level="INFO",
+                    source="DB",
+                )
+                return
+            self.log_message(
+                "Itens em memória divergem do DB.%s",
+                " Recarregando a partir do DB." if repair else "",
+                level="WARNING",
+                source="DB",
+            )
+            if repair:
+                self.items = [self._row_to_item(row) for row in remote]
+                self.items.sort(key=lambda x: (x.item_group, x.item_index, x.money_unit))
+                self._rebuild_item_index()
+                self._refresh_after_local_change()
+
+        self._execute_db_operation(
+            "fetch_items",
+            msg_success="Verificação de consistência concluída.",
+            msg_fail="Erro ao verificar consistência com o DB.",
+            on_done=compare,
+            lane="read",
         )
 
+    def _consistency_check_tick(self):
+        if not (
+            self.remote_paging
+            or self.is_loading
+            or self.staging.entries
+            or self.executor.busy("write")
+        ):
+            self.verify_consistency()
+        self.root.after(self.consistency_check_ms, self._consistency_check_tick)
+
+    @METRICS.timed()
     def add_item(self):
-        start_time = time.time()
         if self.current_category == 50:
-            count_popular = len(
-                [
-                    item
-                    for item in self.items
-                    if item.item_group == 50
-                    and item.money_unit == self.current_money_unit
-                ]
-            )
+            count_popular = self._range_count(50, self.current_money_unit)
             if count_popular >= 8:
                 self.log_message(
                     "Só é permitido até 8 itens na aba POPULAR.",
@@ -1614,24 +6195,11 @@ class ItemMallEditor:
         self.log_message(
             "Abrindo diálogo para adicionar novo item.", level="INFO", source="UI"
         )
-        end_time = time.time()
-        self.log_message(
-            f"Tempo para iniciar adição de item: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="UI",
-        )
 
+    @METRICS.timed()
     def add_item_callback(self, new_item: ItemMall):
-        start_time = time.time()
         if new_item.item_group == 50:
-            count_popular = len(
-                [
-                    item
-                    for item in self.items
-                    if item.item_group == 50
-                    and item.money_unit == self.current_money_unit
-                ]
-            )
+            count_popular = self._range_count(50, self.current_money_unit)
             if count_popular >= 8 and new_item not in self.items:
                 self.log_message(
                     "Só é permitido até 8 itens na aba POPULAR.",
@@ -1645,211 +6213,189 @@ class ItemMallEditor:
             new_item.item_id, f"Item {new_item.item_id}"
         )
 
-        self.insert_item_into_db(new_item)
-        self.load_items_from_db()
-        end_time = time.time()
-        self.log_message(
-            f"Tempo de callback de adição de item: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="UI",
-        )
+        if self.staging_var.get():
+            # A posição é (categoria, índice, moeda), seja qual for o item_id.
+            if any(
+                item.item_group == new_item.item_group
+                and item.item_index == new_item.item_index
+                and item.money_unit == new_item.money_unit
+                for item in self.items
+            ):
+                requested_index = new_item.item_index
+                new_item.item_index = self.get_next_index_for_category(
+                    new_item.item_group, new_item.money_unit
+                )
+                self.log_message(
+                    f"Já existe um item com a mesma Categoria, Index ({requested_index}) e Tipo de Moeda. O item foi adicionado com o índice: {new_item.item_index}.",
+                    level="WARNING",
+                    source="UI",
+                )
+            self.items.append(new_item)
+            self.items_by_key[new_item.key] = new_item
+            self.staging.add(new_item)
+            self._refresh_after_staged_change()
+            return
+
+        self.insert_item_into_db(new_item, on_done=self._after_item_write)
+
+    def _after_item_write(self, rows: Optional[List[tuple]]):
+        if rows is None:
+            self.load_items_from_db()
+            return
+        self._refresh_after_local_change()
 
     def _execute_db_operation(
         self,
-        query: str,
-        params=None,
+        operation: str,
+        *args,
         msg_success: str = "",
         msg_fail: str = "",
-        callback: Optional[Callable] = None,
-    ):
-        if not self.db_conn:
+        on_done: Optional[Callable[[Optional[List[tuple]]], None]] = None,
+        lane: str = "write",
+    ) -> Optional[Future]:
+        """Roda self.store.<operation>(*args) na faixa 'lane'; on_done recebe o resultado ou None."""
+        if not self.store:
             self.log_message(
                 msg_fail or "Não conectado ao banco de dados.",
                 level="ERROR",
                 source="DB",
             )
-            return False
-
-        try:
-            cursor = self.db_conn.cursor()
-            cursor.execute(query, params)
-            self.db_conn.commit()
-            if callback:
-                callback(cursor)
-            cursor.close()
-            self.log_message(msg_success, level="INFO", source="DB")
-            return True
-        except PgError as e:
-            self.db_conn.rollback()
-            self.log_message(f"{msg_fail}: {e}", level="ERROR", source="DB")
-            return False
-        except Exception as e:
-            self.db_conn.rollback()
-            self.log_message(
-                f"Erro inesperado durante a operação no DB: {str(e)}",
-                level="ERROR",
-                source="DB",
-            )
-            return False
+            return None
 
-    def insert_item_into_db(self, item: ItemMall):
-        start_time = time.time()
-        insert_query = """
-            INSERT INTO public.itemmall (item_id, item_group, item_index, item_num, money_unit, point,
-            special_price, sell, on_sell_date, not_sell_date, account_num_limit,
-            recognized_percentage, fortune_bag, allow_buy_level, new_account_day_limit, note)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-        """
+        labels = {"operation": operation, "store": self.store.name}
 
-        check_query = """SELECT COUNT(*) FROM public.itemmall WHERE item_group = %s AND item_index = %s AND money_unit = %s;"""
-        try:
-            cursor = self.db_conn.cursor()
-            cursor.execute(
-                check_query, (item.item_group, item.item_index, item.money_unit)
-            )
-            count = cursor.fetchone()[0]
-            cursor.close()
+        def run():
+            with SLOW_QUERIES.operation(operation), METRICS.timer("db.execute", labels):
+                return getattr(self.store, operation)(*args)
 
-            if count > 0:
-                original_index = item.item_index
-                item.item_index = self.get_next_index_for_category(
-                    item.item_group, item.money_unit
+        def done(future: Future):
+            result = None
+            try:
+                result = future.result()
+                METRICS.increment("db.operations", labels=labels)
+                self.log_message(msg_success, level="INFO", source="DB")
+            except self.store.errors as e:
+                METRICS.increment("db.operations.failed", labels=labels)
+                self.log_message(f"{msg_fail}: {e}", level="ERROR", source="DB")
+            except Exception as e:
+                METRICS.increment("db.operations.failed", labels=labels)
+                self.log_message(
+                    f"Erro inesperado durante a operação no DB: {str(e)}",
+                    level="ERROR",
+                    source="DB",
                 )
+            if on_done:
+                on_done(result)
+
+        return self.executor.submit(lane, run, on_done=done)
+
+    @METRICS.timed()
+    def insert_item_into_db(
+        self, item: ItemMall, on_done: Optional[Callable[[Optional[List[tuple]]], None]] = None
+    ) -> Optional[Future]:
+        """Insere o item numa única ida ao servidor; o índice livre é escolhido pelo store."""
+        requested_index = item.item_index
+
+        def inserted(rows: Optional[List[tuple]]):
+            for row in rows or ():
+                self._upsert_local_item(row, item=item)
+            if rows is not None and item.item_index != requested_index:
                 self.log_message(
-                    f"Já existe um item com a mesma Categoria, Index ({original_index}) e Tipo de Moeda. O item será adicionado com o índice: {item.item_index}.",
+                    f"Já existe um item com a mesma Categoria, Index ({requested_index}) e Tipo de Moeda. O item foi adicionado com o índice: {item.item_index}.",
                     level="WARNING",
                     source="DB",
                 )
-        except Exception as e:
-            self.log_message(
-                f"Erro ao verificar índice do item: {e}", level="ERROR", source="DB"
-            )
+            if on_done:
+                on_done(rows)
 
-        params = (
-            item.item_id,
-            item.item_group,
-            item.item_index,
-            item.item_num,
-            item.money_unit,
-            item.point,
-            item.special_price,
-            item.sell,
-            item.on_sell_date,
-            item.not_sell_date,
-            item.account_num_limit,
-            item.recognized_percentage,
-            item.fortune_bag,
-            item.allow_buy_level,
-            item.new_account_day_limit,
-            item.note,
-        )
-        self._execute_db_operation(
-            insert_query,
-            params,
-            msg_success=f"Item {item.item_id} (Index: {item.item_index}) inserido no banco de dados.",
+        return self._execute_db_operation(
+            "insert_item",
+            item.values(),
+            msg_success=f"Item {item.item_id} inserido no banco de dados.",
             msg_fail="Erro ao inserir item no DB.",
+            on_done=inserted,
         )
-        end_time = time.time()
-        self.log_message(
-            f"Tempo de inserção de item no DB: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="DB",
-        )
-
-    def update_item_in_db(self, item: ItemMall):
-        start_time = time.time()
-        update_query = """
-            UPDATE public.itemmall SET
-                item_id = %s,
-                item_group = %s,
-                item_index = %s,
-                item_num = %s,
-                money_unit = %s,
-                point = %s,
-                special_price = %s,
-                sell = %s,
-                on_sell_date = %s,
-                not_sell_date = %s,
-                account_num_limit = %s,
-                recognized_percentage = %s,
-                fortune_bag = %s,
-                allow_buy_level = %s,
-                new_account_day_limit = %s,
-                note = %s
-            WHERE item_id = %s AND item_group = %s AND item_index = %s AND money_unit = %s;
-        """
-
-        original_item_id = getattr(item, "_original_item_id", item.item_id)
-        original_item_group = getattr(item, "_original_item_group", item.item_group)
-        original_item_index = getattr(item, "_original_item_index", item.item_index)
-        original_money_unit = getattr(item, "_original_money_unit", item.money_unit)
 
-        params = (
-            item.item_id,
-            item.item_group,
-            item.item_index,
-            item.item_num,
-            item.money_unit,
-            item.point,
-            item.special_price,
-            item.sell,
-            item.on_sell_date,
-            item.not_sell_date,
-            item.account_num_limit,
-            item.recognized_percentage,
-            item.fortune_bag,
-            item.allow_buy_level,
-            item.new_account_day_limit,
-            item.note,
-            original_item_id,
-            original_item_group,
-            original_item_index,
-            original_money_unit,
+    @METRICS.timed()
+    def update_item_in_db(
+        self, item: ItemMall, on_done: Optional[Callable[[Optional[List[tuple]]], None]] = None
+    ) -> Optional[Future]:
+        original_key = (
+            getattr(item, "_original_item_id", item.item_id),
+            getattr(item, "_original_item_group", item.item_group),
+            getattr(item, "_original_item_index", item.item_index),
+            getattr(item, "_original_money_unit", item.money_unit),
         )
-        self._execute_db_operation(
-            update_query,
-            params,
+
+        def updated(rows: Optional[List[tuple]]):
+            if rows is not None and len(rows) != 1:
+                self.log_message(
+                    "A atualização afetou %d linhas no DB; recarregando itens.",
+                    len(rows),
+                    level="WARNING",
+                    source="DB",
+                )
+                rows = None
+            if rows is not None:
+                self._upsert_local_item(rows[0], old_key=original_key, item=item)
+            elif self.loaded_fingerprint:
+                # O ItemDialog já alterou o item em memória; sem estas entradas a
+                # recarga incremental não traria de volta os valores do DB.
+                self.loaded_fingerprint.pop((original_key[1], original_key[3]), None)
+                self.loaded_fingerprint.pop((item.item_group, item.money_unit), None)
+            if on_done:
+                on_done(rows)
+
+        return self._execute_db_operation(
+            "update_item",
+            item.values(),
+            original_key,
             msg_success=f"Item {item.item_id} (Index: {item.item_index}) atualizado no banco de dados.",
             msg_fail="Erro ao atualizar item no DB.",
-        )
-        end_time = time.time()
-        self.log_message(
-            f"Tempo de atualização de item no DB: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="DB",
+            on_done=updated,
         )
 
+    @METRICS.timed()
     def remove_item_by_unique_key(self, item_to_remove: ItemMall):
-        self.delete_item_from_db(item_to_remove)
-        self.load_items_from_db()
+        if self.staging_var.get():
+            self.staging.delete(item_to_remove)
+            self.items = [item for item in self.items if item is not item_to_remove]
+            self._rebuild_item_index()
+            self._refresh_after_staged_change()
+            return
+        self.delete_item_from_db(item_to_remove, on_done=self._after_item_write)
 
-    def delete_item_from_db(self, item_to_remove: ItemMall):
-        start_time = time.time()
-        delete_query = """
-            DELETE FROM public.itemmall
-            WHERE item_id = %s AND item_group = %s AND item_index = %s AND money_unit = %s;
-        """
-        params = (
-            item_to_remove.item_id,
-            item_to_remove.item_group,
-            item_to_remove.item_index,
-            item_to_remove.money_unit,
-        )
-        self._execute_db_operation(
-            delete_query,
-            params,
+    @METRICS.timed()
+    def delete_item_from_db(
+        self,
+        item_to_remove: ItemMall,
+        on_done: Optional[Callable[[Optional[List[tuple]]], None]] = None,
+    ) -> Optional[Future]:
+        key = item_to_remove.key
+
+        def deleted(rows: Optional[List[tuple]]):
+            if rows is not None:
+                self._remove_local_items(key)
+            if on_done:
+                on_done(rows)
+
+        return self._execute_db_operation(
+            "delete_item",
+            key,
             msg_success=f"Item {item_to_remove.item_id} (Index: {item_to_remove.item_index}) excluído do banco de dados.",
             msg_fail="Erro ao excluir item do DB.",
-        )
-        end_time = time.time()
-        self.log_message(
-            f"Tempo de exclusão de item do DB: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="DB",
+            on_done=deleted,
         )
 
     def run(self):
         self.root.mainloop()
+        if self.change_feed:
+            self.change_feed.stop()
+        self.executor.shutdown()
+        if self.snapshot_enabled and self.items and not self.data_stale:
+            self._save_snapshot()
+        if self.store:
+            self.store.close()
 
 
 class ItemDialog:
@@ -2309,8 +6855,8 @@ class ItemDialog:
                 source="UI",
             )
 
+    @METRICS.timed("ItemDialog.save")
     def save(self):
-        start_time = time.time()
         try:
             item_id = int(self.entries["item_id"].get())
             item_group = int(self.combos["item_group"].get().split(" - ")[0])
@@ -2457,16 +7003,8 @@ class ItemDialog:
             self.main_app.log_message(
                 f"Ocorreu um erro ao salvar o item: {e}", level="ERROR", source="UI"
             )
-        finally:
-            end_time = time.time()
-            self.main_app.log_message(
-                f"Tempo de salvamento/adição de item: {end_time - start_time:.4f} segundos",
-                level="INFO",
-                source="UI",
-            )
 
     def delete_item(self):
-        start_time = time.time()
         if messagebox.askyesno(
             "Confirmar Exclusão",
             f"Tem certeza que deseja excluir o item '{self.item.display_name}' (ID: {self.item.item_id})?",
@@ -2484,15 +7022,61 @@ class ItemDialog:
                 level="INFO",
                 source="UI",
             )
-        end_time = time.time()
-        self.main_app.log_message(
-            f"Tempo de exclusão de item: {end_time - start_time:.4f} segundos",
-            level="INFO",
-            source="UI",
-        )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerenciador da Loja Grand Fantasia")
+    parser.add_argument(
+        "--profile-cpu",
+        action="store_true",
+        help="Perfila o uso de CPU com cProfile durante toda a sessão.",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Rastreia alocações de memória com tracemalloc durante toda a sessão.",
+    )
+    parser.add_argument(
+        "--profile-dir", help="Pasta onde os relatórios de perfil serão gravados."
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=APP_SETTINGS.get_int("METRICS_PORT", 0),
+        help="Porta local (127.0.0.1) do endpoint OpenMetrics em /metrics. 0 desativa.",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=("postgres", "sqlite"),
+        default=APP_SETTINGS.get("STORAGE_BACKEND", "postgres"),
+        help="Armazenamento da tabela itemmall: PostgreSQL ou SQLite local (offline).",
+    )
+    cli_args = parser.parse_args()
+
+    metrics_server = None
+    if cli_args.metrics_port > 0:
+        metrics_server = MetricsHttpServer(METRICS, cli_args.metrics_port)
+        try:
+            metrics_server.start()
+            FILE_LOGGER.log(
+                "Endpoint de métricas em http://127.0.0.1:%d/metrics",
+                metrics_server.port,
+                level="INFO",
+                source="UI",
+            )
+        except OSError as e:
+            print(f"Não foi possível iniciar o endpoint de métricas: {e}")
+            metrics_server = None
+
+    if cli_args.profile_dir:
+        PROFILER.output_dir = cli_args.profile_dir
+    PROFILER.start(cpu=cli_args.profile_cpu, memory=cli_args.profile_memory)
+
     root = tk.Tk()
-    login_app = LoginScreen(root)
-    root.mainloop()
\ No newline at end of file
+    login_app = LoginScreen(root, storage=cli_args.storage)
+    root.mainloop()
+
+    for report_path in PROFILER.stop():
+        print(f"Perfil salvo em: {report_path}")
+    if metrics_server:
+        metrics_server.stop()
\ No newline at end of file